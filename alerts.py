@@ -0,0 +1,216 @@
+import json                             # For the alert log and webhook bodies
+import math                             # For skipping values that couldn't be worked out
+import queue                            # For sending webhooks in the background
+import sqlite3                          # For storing alert rules
+import threading                        # For changing rules while quotes are being checked
+from bisect import bisect_left, bisect_right    # For finding the thresholds a value moved past
+from datetime import datetime           # For when alerts were triggered
+from database import migrate            # For creating the alerts table
+from metrics import timed               # For timing alert checks when metrics are on
+
+# What a rule can watch: the price, the % move since the market opened, and profit/loss (in the stock's trading currency)
+alert_metrics = {"price": "Price", "move": "% Move Since Open", "profit_loss": "Profit/Loss"}
+
+# A rule triggers when its value rises to (or above) or falls to (or below) the threshold
+alert_directions = {"above": "rises above", "below": "falls below"}
+
+
+def describeAlert(alert: dict) -> str:
+    text = f"{alert['stock_code']} {alert_metrics[alert['metric']].lower()} {alert_directions[alert['direction']]} {alert['threshold']:g}"
+    if "value" in alert:
+        text += f" ({round(alert['value'], 2)})"
+    return text
+
+
+class ThresholdIndex():
+    # Every rule for one stock and metric, sorted by threshold so a new value only looks at the rules it moved past
+    def __init__(self, rules: 'list[dict]') -> None:
+        above = sorted((rule["threshold"], rule["alert_id"]) for rule in rules if rule["direction"] == "above")
+        below = sorted((rule["threshold"], rule["alert_id"]) for rule in rules if rule["direction"] == "below")
+        self.above_thresholds = [rule[0] for rule in above]
+        self.above_ids = [rule[1] for rule in above]
+        self.below_thresholds = [rule[0] for rule in below]
+        self.below_ids = [rule[1] for rule in below]
+
+    def __len__(self) -> int:
+        return len(self.above_ids) + len(self.below_ids)
+
+    def crossed(self, old: 'float | None', new: float) -> 'list[int]':
+        # Rules that weren't met at old but are at new (with no old value, every rule that's met)
+        fired = []
+        if old is None or new > old:
+            start = 0 if old is None else bisect_right(self.above_thresholds, old)
+            fired += self.above_ids[start:bisect_right(self.above_thresholds, new)]
+        if old is None or new < old:
+            stop = len(self.below_thresholds) if old is None else bisect_left(self.below_thresholds, old)
+            fired += self.below_ids[bisect_left(self.below_thresholds, new):stop]
+        return fired
+
+
+class AlertEngine():
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+        migrate(self.connection)
+        self.lock = threading.Lock()
+
+        # alert id -> rule, and stock code -> {metric: ThresholdIndex} built from them
+        self.rules = {}
+        self.indexes = {}
+
+        # (stock code, metric) -> the value the rules were last checked against
+        self.last_values = {}
+
+        # Called with every batch of triggered alerts (the UI, a log file, a webhook)
+        self.listeners = []
+        self.checked_count = 0
+        self.triggered_count = 0
+        self.load()
+
+    def load(self) -> None:
+        rows = self.connection.execute("SELECT alert_id, stock_code, metric, direction, threshold FROM alerts;").fetchall()
+        with self.lock:
+            self.rules = {row[0]: {"alert_id": row[0], "stock_code": row[1], "metric": row[2], "direction": row[3], "threshold": row[4]}
+                          for row in rows}
+            stocks = {}
+            for rule in self.rules.values():
+                stocks.setdefault(rule["stock_code"], []).append(rule)
+            self.indexes = {}
+            for stock_code, rules in stocks.items():
+                self.compile(stock_code, rules)
+
+    def compile(self, stock_code: str, rules: 'list[dict]' = None) -> None:
+        # Rebuilds one stock's indexes after its rules change, every other stock's are left alone (lock must be held)
+        if rules is None:
+            rules = [rule for rule in self.rules.values() if rule["stock_code"] == stock_code]
+        indexes = {metric: ThresholdIndex([rule for rule in rules if rule["metric"] == metric]) for metric in alert_metrics}
+        indexes = {metric: index for metric, index in indexes.items() if len(index)}
+        if len(indexes):
+            self.indexes[stock_code] = indexes
+        else:
+            self.indexes.pop(stock_code, None)
+
+    def subscribe(self, callback) -> None:
+        self.listeners.append(callback)
+
+    def addRule(self, stock_code: str, metric: str, direction: str, threshold: float) -> dict:
+        if metric not in alert_metrics:
+            raise ValueError(f"Unknown alert metric {metric}, expected one of {list(alert_metrics)}")
+        if direction not in alert_directions:
+            raise ValueError(f"Unknown alert direction {direction}, expected one of {list(alert_directions)}")
+
+        with self.connection:
+            alert_id = self.connection.execute("INSERT INTO alerts (stock_code, metric, direction, threshold, created_at) VALUES (?, ?, ?, ?, datetime('now', 'localtime'));",
+                                               (stock_code, metric, direction, float(threshold))).lastrowid
+        rule = {"alert_id": alert_id, "stock_code": stock_code, "metric": metric, "direction": direction, "threshold": float(threshold)}
+        with self.lock:
+            self.rules[alert_id] = rule
+            self.compile(stock_code)
+        return rule
+
+    def removeRule(self, alert_id: int) -> bool:
+        with self.connection:
+            self.connection.execute("DELETE FROM alerts WHERE alert_id=?;", (alert_id,))
+        with self.lock:
+            rule = self.rules.pop(alert_id, None)
+            if rule is not None:
+                self.compile(rule["stock_code"])
+        return rule is not None
+
+    def removeStock(self, stock_code: str) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM alerts WHERE stock_code=?;", (stock_code,))
+        with self.lock:
+            self.rules = {alert_id: rule for alert_id, rule in self.rules.items() if rule["stock_code"] != stock_code}
+            self.indexes.pop(stock_code, None)
+            self.last_values = {key: value for key, value in self.last_values.items() if key[0] != stock_code}
+
+    def stockRules(self, stock_code: str = None) -> 'list[dict]':
+        with self.lock:
+            return [dict(rule) for rule in self.rules.values() if stock_code is None or rule["stock_code"] == stock_code]
+
+    def watches(self, stock_code: str) -> bool:
+        return stock_code in self.indexes
+
+    @timed("alerts.evaluate")
+    def evaluate(self, changes: 'dict[str, dict[str, float | None]]') -> 'list[dict]':
+        # changes is stock code -> {metric: new value} for the stocks in one refresh, only stocks with rules cost anything
+        triggered = []
+        now = str(datetime.now()).split(".")[0]
+        with self.lock:
+            for stock_code, values in changes.items():
+                indexes = self.indexes.get(stock_code)
+                if indexes is None:
+                    continue
+
+                for metric, index in indexes.items():
+                    value = values.get(metric)
+                    if value is None or math.isnan(value):
+                        continue
+
+                    old = self.last_values.get((stock_code, metric))
+                    self.last_values[(stock_code, metric)] = value
+                    for alert_id in index.crossed(old, value):
+                        triggered.append({**self.rules[alert_id], "value": value, "triggered_at": now})
+                self.checked_count += 1
+            self.triggered_count += len(triggered)
+
+        if len(triggered):
+            for callback in list(self.listeners):
+                callback(triggered)
+        return triggered
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"rules": len(self.rules), "stocks": len(self.indexes), "checked": self.checked_count, "triggered": self.triggered_count}
+
+
+class LogSink():
+    # Appends every triggered alert to a file, one JSON object per line
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+
+    def __call__(self, alerts: 'list[dict]') -> None:
+        with self.lock:
+            with open(self.path, "a") as file:
+                for alert in alerts:
+                    file.write(json.dumps({**alert, "message": describeAlert(alert)}) + "\n")
+
+
+class WebhookSink():
+    # Posts every batch of triggered alerts to URL from its own thread, so a slow or missing server doesn't hold up refreshes
+    def __init__(self, URL: str, post=None) -> None:
+        if post is None:
+            from http_client import client
+            post = client.postJSON
+
+        self.URL = URL
+        self.post = post
+        self.pending = queue.SimpleQueue()
+        self.sent_count = 0
+        self.error_count = 0
+        self.thread = threading.Thread(target=self.run, name="alert-webhook", daemon=True)
+        self.thread.start()
+
+    def __call__(self, alerts: 'list[dict]') -> None:
+        self.pending.put([{**alert, "message": describeAlert(alert)} for alert in alerts])
+
+    def run(self) -> None:
+        while True:
+            alerts = self.pending.get()
+            if alerts is None:
+                return
+            try:
+                self.post(self.URL, {"alerts": alerts})
+                self.sent_count += 1
+            except:
+                # Alerts are still shown and logged, the webhook is only one of the places they go
+                self.error_count += 1
+
+    def close(self, timeout: float = 5) -> None:
+        # Waits (up to timeout seconds) for alerts that haven't been sent yet
+        self.pending.put(None)
+        self.thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {"sent": self.sent_count, "errors": self.error_count}
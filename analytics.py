@@ -0,0 +1,383 @@
+import math                             # For annualising volatility
+from collections import deque           # For the values inside each rolling window
+import numpy as np                      # For working on whole price histories at once
+from metrics import timed               # For timing analytics when metrics are on
+
+# Chart range loaded for each holding (daily bars)
+history_range = "1y"
+
+# Seconds between history refreshes while the app is open (only the newest daily bar changes)
+analytics_interval = 900
+
+# Bars used for each moving average and for volatility
+moving_average_windows = [20, 50]
+volatility_window = 20
+
+# Bars in a year for each chart interval, used to annualise volatility
+periods_per_year = {"1m": 252 * 390, "1d": 252, "1wk": 52, "1mo": 12}
+
+# Intervals whose bars are lined up between holdings by trading date rather than timestamp
+dated_intervals = ["1d", "1wk", "1mo"]
+
+# Daily bars are stamped at the exchange's morning open in UTC. Exchanges far enough east (Sydney, Auckland) open
+# the evening before in UTC, so bars stamped at or after this second of the UTC day are for the next day's date.
+# Everywhere else opens between about 00:00 and 14:30 UTC.
+next_day_from = 18 * 3600
+
+# Bars of returns used for correlation between holdings
+correlation_bars = 252
+
+
+def simpleReturns(closes: np.ndarray) -> np.ndarray:
+    # Return from the bar before, the first bar has none (NaN)
+    closes = np.asarray(closes, dtype=np.float64)
+    returns = np.full(len(closes), np.nan)
+    if len(closes) > 1:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns[1:] = closes[1:] / closes[:-1] - 1
+    return returns
+
+def rollingMean(values: np.ndarray, window: int) -> np.ndarray:
+    # Mean of each bar and the window - 1 bars before it (NaN until there are enough bars)
+    values = np.asarray(values, dtype=np.float64)
+    means = np.full(len(values), np.nan)
+    if window <= 0 or len(values) < window:
+        return means
+
+    sums = np.cumsum(np.concatenate([[0], values]))
+    means[window-1:] = (sums[window:] - sums[:-window]) / window
+    return means
+
+def rollingStd(values: np.ndarray, window: int) -> np.ndarray:
+    # Sample standard deviation over the same windows as rollingMean
+    values = np.asarray(values, dtype=np.float64)
+    deviations = np.full(len(values), np.nan)
+    if window <= 1 or len(values) < window:
+        return deviations
+
+    sums = np.cumsum(np.concatenate([[0], values]))
+    squares = np.cumsum(np.concatenate([[0], values * values]))
+    total = sums[window:] - sums[:-window]
+    variance = (squares[window:] - squares[:-window] - total * total / window) / (window - 1)
+    deviations[window-1:] = np.sqrt(np.maximum(variance, 0))
+    return deviations
+
+def rollingVolatility(closes: np.ndarray, window: int = volatility_window, periods: int = 252) -> np.ndarray:
+    # Annualised standard deviation of returns over the last window returns
+    returns = simpleReturns(closes)
+    volatility = np.full(len(returns), np.nan)
+    volatility[1:] = rollingStd(returns[1:], window) * math.sqrt(periods)
+    return volatility
+
+def drawdowns(closes: np.ndarray) -> np.ndarray:
+    # How far below its highest point so far each bar is (0 to -1)
+    closes = np.asarray(closes, dtype=np.float64)
+    if len(closes) == 0:
+        return closes
+    return closes / np.maximum.accumulate(closes) - 1
+
+def maxDrawdown(closes: np.ndarray) -> float:
+    values = drawdowns(closes)
+    return float(np.nanmin(values)) if len(values) and not np.isnan(values).all() else 0.0
+
+def alignCloses(series: 'list[tuple[np.ndarray, np.ndarray]]') -> 'tuple[np.ndarray, np.ndarray]':
+    # Puts (timestamps, closes) for every holding on the same timestamps, each holding keeps its last close until it has a new one
+    if len(series) == 0:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0))
+
+    # Holdings on the same exchange usually have the same timestamps, so each distinct set is only merged once
+    distinct = {}
+    for times, closes in series:
+        if len(times):
+            matches = distinct.setdefault((len(times), int(times[0]), int(times[-1])), [])
+            if not any(np.array_equal(times, other) for other in matches):
+                matches.append(times)
+    distinct = [times for matches in distinct.values() for times in matches]
+    if len(distinct) == 1:
+        timestamps = distinct[0]
+    else:
+        timestamps = np.unique(np.concatenate(distinct)) if len(distinct) else np.empty(0, dtype=np.int64)
+
+    matrix = np.full((len(timestamps), len(series)), np.nan)
+    for column, (times, closes) in enumerate(series):
+        if len(times) == 0:
+            continue
+        if len(times) == len(timestamps) and np.array_equal(times, timestamps):
+            matrix[:, column] = closes
+            continue
+        index = np.searchsorted(times, timestamps, side="right") - 1
+        matrix[:, column] = np.where(index >= 0, closes[np.maximum(index, 0)], np.nan)
+    return timestamps, matrix
+
+def tradingDates(timestamps: np.ndarray) -> np.ndarray:
+    # The trading date of each daily bar (as UTC midnight), the same for every exchange trading that day
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    return (timestamps + (86400 - next_day_from)) // 86400 * 86400
+
+def correlationMatrix(returns: np.ndarray) -> np.ndarray:
+    # returns has one column per holding, bars a holding didn't trade on count as no change
+    if returns.shape[1] == 0:
+        return np.empty((0, 0))
+
+    returns = np.nan_to_num(returns)
+    centred = returns - returns.mean(axis=0)
+    norms = np.sqrt((centred * centred).sum(axis=0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        matrix = (centred.T @ centred) / np.outer(norms, norms)
+    return matrix
+
+def carryForward(closes: np.ndarray) -> np.ndarray:
+    # Gaps keep the last close, gaps before the first close stay NaN
+    closes = np.asarray(closes, dtype=np.float64)
+    index = np.where(np.isnan(closes), 0, np.arange(len(closes)))
+    np.maximum.accumulate(index, out=index)
+    return closes[index] if len(closes) else closes
+
+def movingAverages(closes: np.ndarray) -> 'dict[int, np.ndarray]':
+    # One line per window in moving_average_windows, for drawing over a chart
+    closes = carryForward(closes)
+    return {window: rollingMean(closes, window) for window in moving_average_windows}
+
+def rangeSummary(closes: np.ndarray, periods: int = 252) -> dict:
+    # Return, volatility and max drawdown over a whole chart range (missing closes are skipped)
+    closes = np.asarray(closes, dtype=np.float64)
+    closes = closes[~np.isnan(closes)]
+    if len(closes) < 3:
+        return {"return": math.nan, "volatility": math.nan, "max_drawdown": math.nan}
+
+    returns = simpleReturns(closes)[1:]
+    return {"return": float(closes[-1] / closes[0] - 1), "volatility": float(np.std(returns, ddof=1) * math.sqrt(periods)),
+            "max_drawdown": maxDrawdown(closes)}
+
+
+class RollingWindow():
+    # Running sum and sum of squares of the last size values, so the mean and deviation don't need the whole window
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.values = deque(maxlen=size)
+        self.total = 0.0
+        self.squares = 0.0
+
+    def push(self, value: float) -> None:
+        if len(self.values) == self.size:
+            old = self.values[0]
+            self.total -= old
+            self.squares -= old * old
+        self.values.append(value)
+        self.total += value
+        self.squares += value * value
+
+    def replaceLast(self, value: float) -> None:
+        # The newest value was revised, the rest of the window is unchanged
+        old = self.values[-1]
+        self.values[-1] = value
+        self.total += value - old
+        self.squares += value * value - old * old
+
+    def extend(self, values: np.ndarray) -> None:
+        # Many values at once (e.g. the first load) only keep the last size of them
+        if len(values) >= self.size:
+            tail = np.asarray(values[-self.size:], dtype=np.float64)
+            self.values = deque(tail.tolist(), maxlen=self.size)
+            self.total = float(tail.sum())
+            self.squares = float((tail * tail).sum())
+        else:
+            for value in values:
+                self.push(float(value))
+
+    def full(self) -> bool:
+        return len(self.values) == self.size
+
+    def mean(self) -> float:
+        return self.total / len(self.values) if self.full() else math.nan
+
+    def std(self) -> float:
+        if not self.full() or self.size < 2:
+            return math.nan
+        variance = (self.squares - self.total * self.total / self.size) / (self.size - 1)
+        return math.sqrt(max(variance, 0))
+
+
+class SeriesStats():
+    # Analytics for one holding, updated bar by bar as new closes arrive instead of from the whole history
+    def __init__(self, interval: str = "1d") -> None:
+        self.periods = periods_per_year.get(interval, 252)
+
+        # Bars are added to the end of buffers with room to spare, timestamps and closes are views of the filled part
+        self.time_buffer = np.empty(0, dtype=np.int64)
+        self.close_buffer = np.empty(0)
+        self.timestamps = self.time_buffer
+        self.closes = self.close_buffer
+
+        self.peak = math.nan
+        self.max_drawdown = 0.0
+
+        # Peak and max drawdown before the last bar, so the last bar can be revised (today's bar changes until the market closes)
+        self.last_peak = math.nan
+        self.last_max_drawdown = 0.0
+        self.averages = {window: RollingWindow(window) for window in moving_average_windows}
+        self.returns = RollingWindow(volatility_window)
+
+    def lastTimestamp(self) -> 'int | None':
+        return int(self.timestamps[-1]) if len(self.timestamps) else None
+
+    def extend(self, timestamps: np.ndarray, closes: np.ndarray) -> int:
+        # Adds the bars newer than the last one seen and revises the last one, returns how many bars were added or changed
+        if len(closes) == 1:
+            return self.addBar(int(timestamps[0]), closes[0])
+
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        closes = np.asarray(closes, dtype=np.float64)
+
+        # Missing closes are skipped so they don't break the windows
+        keep = ~np.isnan(closes)
+        timestamps, closes = timestamps[keep], closes[keep]
+        changed = 0
+        if len(self.timestamps):
+            revised = closes[timestamps == self.timestamps[-1]]
+            if len(revised):
+                changed = self.reviseLast(float(revised[-1]))
+            new = timestamps > self.timestamps[-1]
+            timestamps, closes = timestamps[new], closes[new]
+        if len(closes) == 0:
+            return changed
+
+        previous = self.closes[-1:] if len(self.closes) else closes[:0]
+        returns = simpleReturns(np.concatenate([previous, closes]))[1:] if len(previous) else simpleReturns(closes)[1:]
+
+        # Peak and drawdown continue from where the last update stopped
+        peaks = np.maximum.accumulate(np.concatenate([[self.peak], closes]) if not math.isnan(self.peak) else closes)
+        peaks = peaks[-len(closes):]
+        bar_drawdowns = closes / peaks - 1
+        self.last_peak = float(peaks[-2]) if len(closes) > 1 else self.peak
+        self.last_max_drawdown = min(self.max_drawdown, float(bar_drawdowns[:-1].min())) if len(closes) > 1 else self.max_drawdown
+        self.peak = float(peaks[-1])
+        self.max_drawdown = min(self.max_drawdown, float(bar_drawdowns.min()))
+
+        for window in self.averages.values():
+            window.extend(closes)
+        self.returns.extend(returns)
+
+        self.append(timestamps, closes)
+        return changed + len(closes)
+
+    def addBar(self, timestamp: int, close: 'float | None') -> int:
+        # The usual refresh (one new or revised bar) without any array maths
+        if close is None or math.isnan(close):
+            return 0
+        if len(self.closes) and timestamp <= self.timestamps[-1]:
+            return self.reviseLast(float(close)) if timestamp == self.timestamps[-1] else 0
+
+        close = float(close)
+        if len(self.closes):
+            self.returns.push(close / self.closes[-1] - 1)
+        self.last_peak = self.peak
+        self.last_max_drawdown = self.max_drawdown
+        self.peak = close if math.isnan(self.peak) else max(self.peak, close)
+        self.max_drawdown = min(self.max_drawdown, close / self.peak - 1)
+        for window in self.averages.values():
+            window.push(close)
+
+        self.append([timestamp], [close])
+        return 1
+
+    def reviseLast(self, close: float) -> int:
+        # Replaces the last bar's close, undoing what it added to every window, returns 1 if it changed
+        if close == self.closes[-1]:
+            return 0
+
+        if len(self.closes) > 1:
+            self.returns.replaceLast(close / self.closes[-2] - 1)
+        for window in self.averages.values():
+            window.replaceLast(close)
+        self.peak = close if math.isnan(self.last_peak) else max(self.last_peak, close)
+        self.max_drawdown = min(self.last_max_drawdown, close / self.peak - 1)
+        self.closes[-1] = close
+        return 1
+
+    def append(self, timestamps: np.ndarray, closes: np.ndarray) -> None:
+        # Doubling the buffers when they're full means a new bar doesn't copy the whole history
+        count = len(self.closes)
+        if count + len(closes) > len(self.close_buffer):
+            size = max(2 * len(self.close_buffer), count + len(closes), 64)
+            self.time_buffer = np.concatenate([self.timestamps, np.empty(size - count, dtype=np.int64)])
+            self.close_buffer = np.concatenate([self.closes, np.empty(size - count)])
+
+        self.time_buffer[count:count+len(closes)] = timestamps
+        self.close_buffer[count:count+len(closes)] = closes
+        self.timestamps = self.time_buffer[:count+len(closes)]
+        self.closes = self.close_buffer[:count+len(closes)]
+
+    def summary(self) -> dict:
+        if len(self.closes) == 0:
+            return {"bars": 0}
+
+        last_return = self.closes[-1] / self.closes[-2] - 1 if len(self.closes) > 1 else math.nan
+        return {"bars": len(self.closes), "close": float(self.closes[-1]), "return": float(last_return),
+                "moving_averages": {window: average.mean() for window, average in self.averages.items()},
+                "volatility": self.returns.std() * math.sqrt(self.periods),
+                "drawdown": float(self.closes[-1] / self.peak - 1), "max_drawdown": self.max_drawdown}
+
+
+class PortfolioAnalytics():
+    def __init__(self, interval: str = "1d") -> None:
+        self.interval = interval
+        self.holdings = {}
+
+    @timed("analytics.update")
+    def update(self, stock_code: str, timestamps: np.ndarray, closes: np.ndarray) -> int:
+        # Only bars after the last update are added (and the last one revised), returns how many
+        if self.interval in dated_intervals:
+            # Holdings on different exchanges then share one bar per day, the last bar of a date is the one kept
+            timestamps = tradingDates(timestamps)
+            closes = np.asarray(closes, dtype=np.float64)
+            if len(timestamps) > 1:
+                keep = ~np.isnan(closes)
+                timestamps, closes = timestamps[keep], closes[keep]
+                last = np.append(timestamps[1:] != timestamps[:-1], True)
+                timestamps, closes = timestamps[last], closes[last]
+
+        if stock_code not in self.holdings:
+            self.holdings[stock_code] = SeriesStats(self.interval)
+        return self.holdings[stock_code].extend(timestamps, closes)
+
+    def remove(self, stock_code: str) -> None:
+        self.holdings.pop(stock_code, None)
+
+    def summary(self, stock_code: str) -> dict:
+        return self.holdings[stock_code].summary()
+
+    def portfolioValues(self, weights: 'dict[str, float]') -> 'tuple[np.ndarray, np.ndarray]':
+        # Value of the whole portfolio at every bar, weights are usually quantity times the exchange rate
+        codes = [code for code in weights if code in self.holdings]
+        timestamps, matrix = alignCloses([(self.holdings[code].timestamps, self.holdings[code].closes) for code in codes])
+        if len(codes) == 0:
+            return timestamps, np.empty(0)
+
+        # Holdings count from their first bar
+        values = np.nan_to_num(matrix) @ np.array([weights[code] for code in codes], dtype=np.float64)
+        return timestamps, values
+
+    @timed("analytics.portfolio")
+    def portfolioSummary(self, weights: 'dict[str, float]') -> dict:
+        timestamps, values = self.portfolioValues(weights)
+        if len(values) == 0:
+            return {"bars": 0}
+
+        returns = simpleReturns(values)
+        volatility = rollingVolatility(values, volatility_window, periods_per_year.get(self.interval, 252))
+        return {"bars": len(values), "value": float(values[-1]), "return": float(returns[-1]),
+                "volatility": float(volatility[-1]), "max_drawdown": maxDrawdown(values)}
+
+    @timed("analytics.correlation")
+    def correlation(self, bars: int = correlation_bars) -> 'tuple[list[str], np.ndarray]':
+        # Correlation of every pair of holdings' returns over the last bars bars
+        codes = list(self.holdings.keys())
+        timestamps, matrix = alignCloses([(self.holdings[code].timestamps[-bars-1:], self.holdings[code].closes[-bars-1:])
+                                          for code in codes])
+        if len(timestamps) < 2:
+            return codes, np.full((len(codes), len(codes)), np.nan)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = matrix[1:] / matrix[:-1] - 1
+        return codes, correlationMatrix(returns[-bars:])
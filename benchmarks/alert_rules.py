@@ -0,0 +1,83 @@
+# Compares checking every alert rule on each refresh against AlertEngine's per-stock threshold indexes
+# Run with "python benchmarks/alert_rules.py"
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alerts import AlertEngine, alert_metrics
+from database import openDatabase
+
+# Stocks watched, how many of them change in each refresh, and refreshes timed
+symbols = 500
+changed_per_refresh = 50
+refreshes = 200
+
+
+def syntheticRules(engine: AlertEngine, count: int) -> None:
+    generator = random.Random(1)
+    with engine.connection:
+        engine.connection.executemany("INSERT INTO alerts (stock_code, metric, direction, threshold) VALUES (?, ?, ?, ?);",
+                                      [(f"S{generator.randrange(symbols)}", generator.choice(list(alert_metrics)),
+                                        generator.choice(["above", "below"]), generator.uniform(50, 150)) for i in range(count)])
+
+def syntheticRefreshes() -> 'list[dict]':
+    generator = random.Random(2)
+    prices = {f"S{i}": 100.0 for i in range(symbols)}
+    batches = []
+    for i in range(refreshes):
+        changes = {}
+        for stock_code in generator.sample(list(prices), changed_per_refresh):
+            prices[stock_code] *= 1 + generator.gauss(0, 0.02)
+            changes[stock_code] = {"price": prices[stock_code], "move": prices[stock_code] - 100, "profit_loss": prices[stock_code] - 100}
+        batches.append(changes)
+    return batches
+
+def checkEveryRule(rules: 'list[dict]', batches: 'list[dict]') -> int:
+    # Every rule is compared with its stock's last and new value on every refresh
+    last_values = {}
+    triggered = 0
+    for changes in batches:
+        for rule in rules:
+            values = changes.get(rule["stock_code"])
+            if values is None:
+                continue
+            new = values[rule["metric"]]
+            old = last_values.get((rule["stock_code"], rule["metric"]))
+            if rule["direction"] == "above":
+                triggered += new >= rule["threshold"] and (old is None or old < rule["threshold"])
+            else:
+                triggered += new <= rule["threshold"] and (old is None or old > rule["threshold"])
+        for stock_code, values in changes.items():
+            for metric, value in values.items():
+                last_values[(stock_code, metric)] = value
+    return triggered
+
+def useIndexes(engine: AlertEngine, batches: 'list[dict]') -> int:
+    return sum(len(engine.evaluate(changes)) for changes in batches)
+
+
+if __name__ == "__main__":
+    batches = syntheticRefreshes()
+    print(f"{'rules':>8} {'compile':>9} {'every rule':>12} {'indexes':>10} {'triggered':>10}")
+    for count in [100, 1000, 10000, 100000]:
+        engine = AlertEngine(openDatabase(":memory:"))
+        syntheticRules(engine, count)
+        start = time.perf_counter()
+        engine.load()
+        compiled = time.perf_counter() - start
+
+        rules = engine.stockRules()
+        start = time.perf_counter()
+        naive = checkEveryRule(rules, batches)
+        naive_time = (time.perf_counter() - start) / refreshes
+
+        start = time.perf_counter()
+        indexed = useIndexes(engine, batches)
+        indexed_time = (time.perf_counter() - start) / refreshes
+
+        assert naive == indexed, f"Triggered {naive} alerts checking every rule but {indexed} with indexes"
+        print(f"{count:>8} {compiled*1000:>7.1f}ms {naive_time*1000:>10.3f}ms {indexed_time*1000:>8.3f}ms {indexed:>10}")
@@ -0,0 +1,89 @@
+# Compares working out every holding's analytics from the whole history again against adding only the newest bar
+# Run with "python benchmarks/analytics_update.py" (synthetic daily prices, no internet needed)
+
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import (PortfolioAnalytics, rollingMean, rollingVolatility, maxDrawdown, moving_average_windows,
+                       correlationMatrix, simpleReturns, correlation_bars)
+
+# Five years of daily bars, then a week of new bars added one refresh at a time
+bars = 252 * 5
+new_bars = 5
+
+
+def syntheticHistory(holdings: int) -> 'tuple[np.ndarray, np.ndarray]':
+    generator = np.random.default_rng(1)
+    timestamps = 1500000000 + np.arange(bars + new_bars, dtype=np.int64) * 86400
+    closes = 100 * np.cumprod(1 + generator.normal(0, 0.02, (holdings, bars + new_bars)), axis=1)
+    return timestamps, closes
+
+def fromScratch(timestamps: np.ndarray, closes: np.ndarray) -> None:
+    # What every refresh would cost if nothing was kept between them
+    for row in closes:
+        for window in moving_average_windows:
+            rollingMean(row, window)
+        rollingVolatility(row)
+        maxDrawdown(row)
+
+def checkMixedExchanges() -> None:
+    # Hong Kong, Sydney and New York bars for the same days are stamped hours apart (Sydney's the evening before in UTC)
+    # They have to line up by date, or each bar only moves one holding and correlation and volatility are wrong
+    generator = np.random.default_rng(2)
+    days = 300
+    moves = generator.normal(0, 0.01, days)
+    closes = np.array([100 * np.cumprod(1 + moves + generator.normal(0, 0.002, days)) for i in range(3)])
+    dates = 1700000000 // 86400 * 86400 + np.arange(days, dtype=np.int64) * 86400
+
+    analytics = PortfolioAnalytics()
+    for code, open_offset, row in zip(["0005.HK", "CBA.AX", "AAPL"], [5400, -3600, 48600], closes):
+        analytics.update(code, dates + open_offset, row)
+
+    codes, correlation = analytics.correlation()
+    expected = correlationMatrix(np.array([simpleReturns(row)[-correlation_bars:] for row in closes]).T)
+    assert np.allclose(correlation, expected), f"Correlation across exchanges is {correlation.round(2).tolist()}, expected {expected.round(2).tolist()}"
+
+    summary = analytics.portfolioSummary({code: 1 for code in codes})
+    assert summary["bars"] == days, f"{days} days became {summary['bars']} bars"
+    assert abs(summary["volatility"] - rollingVolatility(closes.sum(axis=0))[-1]) < 1e-9, "Portfolio volatility across exchanges doesn't match"
+
+def timeIt(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    checkMixedExchanges()
+    print(f"{'holdings':>8} {'first load':>11} {'recompute':>10} {'new bar':>9} {'portfolio':>10} {'correlation':>12}")
+    for holdings in [10, 100, 500]:
+        timestamps, closes = syntheticHistory(holdings)
+        codes = [f"S{i}" for i in range(holdings)]
+        analytics = PortfolioAnalytics()
+
+        # Five years first, then each new bar on its own like the next day's refresh
+        def firstLoad() -> None:
+            for i in range(holdings):
+                analytics.update(codes[i], timestamps[:bars], closes[i, :bars])
+
+        def newBar(bar: int) -> None:
+            for i in range(holdings):
+                analytics.update(codes[i], timestamps[bar:bar+1], closes[i, bar:bar+1])
+
+        first_load = timeIt(firstLoad)
+        recompute = timeIt(fromScratch, timestamps, closes)
+        new_bar = sum(timeIt(newBar, bar) for bar in range(bars, bars + new_bars)) / new_bars
+        portfolio = timeIt(analytics.portfolioSummary, {code: 10 for code in codes})
+        correlation = timeIt(analytics.correlation)
+
+        # The incremental values must match working them out from scratch
+        summary = analytics.summary(codes[-1])
+        assert abs(summary["max_drawdown"] - maxDrawdown(closes[-1])) < 1e-9, "Drawdowns don't match"
+        assert abs(summary["volatility"] - rollingVolatility(closes[-1])[-1]) < 1e-9, "Volatility doesn't match"
+
+        print(f"{holdings:>8} {first_load*1000:>9.1f}ms {recompute*1000:>8.1f}ms {new_bar*1000:>7.1f}ms "
+              f"{portfolio*1000:>8.1f}ms {correlation*1000:>10.1f}ms")
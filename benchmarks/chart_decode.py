@@ -0,0 +1,64 @@
+# Compares parsing whole chart responses with json against reading only the arrays that are stored
+# Run with "python benchmarks/chart_decode.py" (peak memory is measured with tracemalloc, so times include its overhead)
+
+import json
+import os
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import HistoryStore
+from mock_server import chartFor
+
+
+def syntheticBody(points: int) -> bytes:
+    # One minute bars with a few gaps, like an intraday response
+    end = 1700000000 + points * 60
+    body = chartFor("AAPL", {"interval": ["1m"], "period1": [1700000000], "period2": [end]})
+    quote = body["chart"]["result"][0]["indicators"]["quote"][0]
+    for i in range(0, points, 97):
+        quote["close"][i] = None
+    return json.dumps(body).encode()
+
+def oldPath(body: bytes) -> int:
+    store = HistoryStore(sqlite3.connect(":memory:"), lambda URL: json.loads(body), "")
+    return store.download("AAPL", "1m", "1d")
+
+def newPath(body: bytes) -> int:
+    store = HistoryStore(sqlite3.connect(":memory:"), None, "", lambda URL: body)
+    return store.download("AAPL", "1m", "1d")
+
+def decodeOnlyOld(body: bytes) -> int:
+    result = json.loads(body)["chart"]["result"][0]
+    return len(result["timestamp"]) + len(result["indicators"]["quote"][0]["close"])
+
+def decodeOnlyNew(body: bytes) -> int:
+    from chart_data import decodeChart
+    chart = decodeChart(body)
+    return len(chart["timestamp"]) + len(chart["close"])
+
+def measure(function, body: bytes) -> 'tuple[float, float, float]':
+    # (seconds without tracing, peak MB with tracing)
+    start = time.perf_counter()
+    function(body)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    function(body)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 1024 / 1024
+
+
+if __name__ == "__main__":
+    print(f"{'points':>8} {'body':>8} {'step':<16} {'old time':>9} {'old peak':>9} {'new time':>9} {'new peak':>9}")
+    for points in [10000, 100000, 1000000]:
+        body = syntheticBody(points)
+        for step, old, new in [("decode", decodeOnlyOld, decodeOnlyNew), ("decode + store", oldPath, newPath)]:
+            old_time, old_peak = measure(old, body)
+            new_time, new_peak = measure(new, body)
+            print(f"{points:>8} {len(body)/1024/1024:>6.1f}MB {step:<16} {old_time*1000:>7.0f}ms {old_peak:>7.1f}MB "
+                  f"{new_time*1000:>7.0f}ms {new_peak:>7.1f}MB")
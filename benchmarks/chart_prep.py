@@ -0,0 +1,60 @@
+# Compares preparing chart series with Python loops against chart_data.py's NumPy version
+# Run with "python benchmarks/chart_prep.py"
+
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chart_data import localTimes, toFloats, forwardFill, valueRange
+
+
+def syntheticSeries(points: int) -> 'tuple[list[int], list]':
+    # One minute bars with roughly 1% of the prices missing
+    random.seed(points)
+    start = 1700000000
+    timestamps = [start + i * 60 for i in range(points)]
+    prices = [None if random.random() < 0.01 else 100 + random.random() for i in range(points)]
+    return timestamps, prices
+
+def oldPath(timestamps: 'list[int]', prices: list) -> 'tuple[list[datetime], tuple[float, float]]':
+    # The per point loops StockInfoWindow used before
+    times = [datetime.fromtimestamp(x) for x in timestamps]
+    data = list(prices)
+    for i, val in enumerate(data):
+        if val == None:
+            data[i] = data[i-1]
+        elif i == 0 and val == None:
+            data[i] = 0
+    return times, (min(data), max(data))
+
+def newPath(timestamps: 'list[int]', prices: list) -> 'tuple[np.ndarray, tuple[float, float]]':
+    times = localTimes(timestamps)
+    data = forwardFill(toFloats(prices))
+    return times, valueRange([data])
+
+def best(function, *args, repeat: int = 3) -> float:
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == "__main__":
+    print(f"{'points':>9} {'loops':>10} {'numpy':>10} {'speedup':>8}")
+    for points in [1000, 100000, 1000000]:
+        timestamps, prices = syntheticSeries(points)
+        old_times, old_range = oldPath(timestamps, prices)
+        new_times, new_range = newPath(timestamps, prices)
+        assert old_range == new_range, f"Ranges differ: {old_range} and {new_range}"
+        assert np.array_equal(np.array(old_times, dtype="datetime64[s]"), new_times), "Local times differ"
+        old_time = best(oldPath, timestamps, prices)
+        new_time = best(newPath, timestamps, prices)
+        print(f"{points:>9} {old_time*1000:>8.1f}ms {new_time*1000:>8.1f}ms {old_time/new_time:>7.1f}x")
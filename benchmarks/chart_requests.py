@@ -0,0 +1,52 @@
+# Compares showing all four price series on a chart before and after loading every column at once
+# Run with "python benchmarks/chart_requests.py" (uses mock_server.py, no internet needed)
+
+import json
+import os
+import sqlite3
+import sys
+import time
+from urllib.request import urlopen
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import HistoryStore, chart_intervals
+from mock_server import startMockServer
+
+metrics = ["low", "high", "open", "close"]
+
+
+def search(URL: str) -> dict:
+    with urlopen(URL) as response:
+        return json.loads(response.read())
+
+def oldPath(base_url: str, stock_code: str, duration: str) -> None:
+    # One chart request for every checked series
+    for metric in metrics:
+        URL = f"{base_url}/v8/finance/chart/{stock_code}?metrics={metric}?&range={duration}&interval={chart_intervals[duration]}"
+        search(URL)["chart"]["result"][0]["indicators"]["quote"][0][metric]
+
+def newPath(base_url: str, stock_code: str, duration: str) -> None:
+    # One load for the range, then every series comes from the same columns
+    store = HistoryStore(sqlite3.connect(":memory:"), search, base_url)
+    chart = store.loadChart(stock_code, duration)
+    for metric in metrics:
+        chart[metric]
+
+def measure(server, function, *args) -> 'tuple[int, float]':
+    requests_before = server.request_count
+    start = time.perf_counter()
+    function(*args)
+    return server.request_count - requests_before, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    server, base_url = startMockServer(latency=0.02)
+
+    print(f"{'range':<6} {'old requests':>12} {'old time':>10} {'new requests':>12} {'new time':>10}")
+    for duration in ["1d", "1mo", "1y", "5y", "max"]:
+        old_requests, old_time = measure(server, oldPath, base_url, "AAPL", duration)
+        new_requests, new_time = measure(server, newPath, base_url, "AAPL", duration)
+        print(f"{duration:<6} {old_requests:>12} {old_time*1000:>8.1f}ms {new_requests:>12} {new_time*1000:>8.1f}ms")
+
+    server.shutdown()
@@ -0,0 +1,48 @@
+# Measures how long the headless CLI takes to start, print a snapshot and exit, in a new process each time
+# Run with "python benchmarks/cli_startup.py" (uses mock_server.py for the refresh, no internet needed)
+
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+root_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_folder)
+
+from mock_server import startMockServer
+
+runs = 10
+
+
+def coldStart(arguments: 'list[str]') -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(root_folder, "cli.py"), *arguments], capture_output=True, check=False)
+    return time.perf_counter() - start
+
+def loadedModules() -> 'list[str]':
+    # GUI-only modules that importing the engine pulls in (should be none)
+    code = "import sys, engine; print(' '.join(name for name in ['tkinter', 'matplotlib', 'requests'] if name in sys.modules))"
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=root_folder).stdout.split()
+
+
+if __name__ == "__main__":
+    server, base_url = startMockServer()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "stocks.db")
+        shutil.copy(os.path.join(root_folder, "stocks.db"), path)
+
+        baseline = [coldStart(["--help"]) for i in range(runs)]
+        cases = {"saved values": ["--db", path, "--no-refresh"],
+                 "refresh": ["--db", path, "--yahoo-url", base_url, "--exchange-rate-url", base_url]}
+
+        print(f"{'case':<14} {'median':>8} {'max':>8}")
+        print(f"{'--help':<14} {statistics.median(baseline)*1000:>6.0f}ms {max(baseline)*1000:>6.0f}ms")
+        for name, arguments in cases.items():
+            times = [coldStart(arguments) for i in range(runs)]
+            print(f"{name:<14} {statistics.median(times)*1000:>6.0f}ms {max(times)*1000:>6.0f}ms")
+
+    print(f"Modules loaded by importing the engine: {', '.join(loadedModules()) or 'none of tkinter, matplotlib or requests'}")
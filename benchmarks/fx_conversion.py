@@ -0,0 +1,65 @@
+# Compares converting holdings with one exchange rate request each against one cached rate table
+# Run with "python benchmarks/fx_conversion.py" (uses mock_server.py, no internet needed)
+
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from urllib.request import urlopen
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fx import RateTable, portfolioTotals
+from mock_server import startMockServer, usd_rates
+
+
+def search(URL: str) -> dict:
+    with urlopen(URL) as response:
+        return json.loads(response.read())
+
+def syntheticStocks(holdings: int) -> 'list[dict]':
+    generator = random.Random(1)
+    currencies = list(usd_rates.keys())
+    return [{"selling_price": generator.uniform(1, 500), "quantity": generator.randint(1, 100),
+             "buying_price": generator.uniform(100, 5000), "currency": generator.choice(currencies)} for i in range(holdings)]
+
+def oldPath(base_url: str, stocks: 'list[dict]', currency: str) -> float:
+    # One request for every stock's rate, then the totals are added up one row at a time
+    total = 0
+    for stock in stocks:
+        rate = float(search(f"{base_url}/v6/key/latest/{stock['currency']}")["conversion_rates"][currency])
+        total += (stock["selling_price"] * stock["quantity"] - stock["buying_price"]) * rate
+    return total
+
+def newPath(base_url: str, stocks: 'list[dict]', currency: str) -> float:
+    rate_table = RateTable(sqlite3.connect(":memory:"), search, base_url, "key")
+    rate_table.refresh()
+    return portfolioTotals(rate_table, stocks, currency)["profit_loss"]
+
+def measure(server, function, *args) -> 'tuple[int, float, float]':
+    requests_before = server.request_count
+    start = time.perf_counter()
+    result = function(*args)
+    return server.request_count - requests_before, time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    server, base_url = startMockServer(latency=0.02)
+
+    print(f"{'holdings':>8} {'old requests':>12} {'old time':>10} {'new requests':>12} {'new time':>10}")
+    for holdings in [10, 100, 1000]:
+        stocks = syntheticStocks(holdings)
+        old_requests, old_time, old_total = measure(server, oldPath, base_url, stocks, "GBP")
+        new_requests, new_time, new_total = measure(server, newPath, base_url, stocks, "GBP")
+        assert abs(old_total - new_total) < 0.01 * holdings, "Totals don't match"
+        print(f"{holdings:>8} {old_requests:>12} {old_time*1000:>8.1f}ms {new_requests:>12} {new_time*1000:>8.1f}ms")
+
+    # Working out the totals again on every refresh uses the stored table only
+    rate_table = RateTable(sqlite3.connect(":memory:"), search, base_url, "key")
+    rate_table.refresh()
+    stocks = syntheticStocks(100000)
+    start = time.perf_counter()
+    portfolioTotals(rate_table, stocks, "EUR")
+    print(f"Totals for 100000 holdings from the stored rates: {(time.perf_counter() - start)*1000:.1f}ms")
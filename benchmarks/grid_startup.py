@@ -0,0 +1,88 @@
+# Compares building the portfolio table from one widget per cell against PortfolioGrid
+# Run with "python benchmarks/grid_startup.py" (needs a display, each case runs in its own process)
+
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+root_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_folder)
+
+
+def syntheticDatabase(path: str, holdings: int) -> None:
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE stocks (stock_code TEXT PRIMARY KEY, stock_name TEXT, selling_price NUMERIC, quantity INTEGER, buying_price NUMERIC, last_updated TEXT, currency TEXT NOT NULL ON CONFLICT IGNORE, price_change TEXT);")
+    connection.executemany("INSERT INTO stocks VALUES (?, ?, 100, 1, 100, '2024-07-20 22:18:23', 'USD', 'Increase');",
+                           [(f"S{i}", f"Stock {i}") for i in range(holdings)])
+    connection.commit()
+    connection.close()
+
+def widgetTable(window, table: 'list[dict]') -> None:
+    # The old layout: 11 widgets and 6 StringVars per stock, all gridded
+    from tkinter import StringVar
+    from tkinter.ttk import Frame, Label, Button
+
+    frame = Frame(master=window)
+    for i, stock in enumerate(table):
+        variables = [StringVar(value="Loading...") for j in range(6)]
+        widgets = [Button(text="View Info", master=frame),
+                   Label(text=stock["stock_code"], master=frame),
+                   Label(text=stock["stock_name"], master=frame),
+                   Label(text=stock["currency"], master=frame),
+                   Label(textvariable=variables[0], master=frame),
+                   Label(text=stock["quantity"], master=frame),
+                   Label(text=stock["buying_price"], master=frame),
+                   Label(textvariable=variables[1], master=frame),
+                   Label(textvariable=variables[3], master=frame),
+                   Label(textvariable=variables[5], master=frame),
+                   Button(text="Remove", master=frame)]
+        for j, widget in enumerate(widgets):
+            widget.grid(row=i, column=j)
+    frame.grid(row=0, column=0)
+
+def gridTable(window, table: 'list[dict]') -> None:
+    from portfolio_grid import PortfolioGrid
+
+    grid = PortfolioGrid(window, ("Arial", 12))
+    for stock in table:
+        grid.addRow(stock["stock_code"], {**stock, "selling_price": "Loading...", "price_change": "Loading...",
+                                           "profit_loss": "Loading...", "last_updated": "Loading..."})
+    grid.grid(row=0, column=0)
+
+def runCase(kind: str, path: str) -> None:
+    # Runs in a child process and prints "seconds peak_rss_kb"
+    from tkinter import Tk
+
+    start = time.perf_counter()
+    connection = sqlite3.connect(path)
+    connection.row_factory = sqlite3.Row
+    table = [dict(row) for row in connection.execute("SELECT * FROM stocks;")]
+
+    window = Tk()
+    (widgetTable if kind == "widgets" else gridTable)(window, table)
+    window.update()
+    seconds = time.perf_counter() - start
+    window.destroy()
+
+    print(seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        runCase(sys.argv[1], sys.argv[2])
+        sys.exit()
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"{'rows':>6} {'table':<8} {'startup':>10} {'peak RSS':>10}")
+        for holdings in [10, 1000, 10000]:
+            path = os.path.join(folder, f"stocks_{holdings}.db")
+            syntheticDatabase(path, holdings)
+
+            for kind in ["widgets", "grid"]:
+                output = subprocess.run([sys.executable, __file__, kind, path], capture_output=True, text=True, check=True).stdout
+                seconds, rss = output.split()
+                print(f"{holdings:>6} {kind:<8} {float(seconds)*1000:>8.0f}ms {int(rss)/1024:>8.1f}MB")
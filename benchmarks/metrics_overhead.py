@@ -0,0 +1,33 @@
+# Measures what timing a function costs with metrics turned off and on
+# Run with "python benchmarks/metrics_overhead.py"
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+
+calls = 1000000
+
+
+def plain(value: int) -> int:
+    return value + 1
+
+timed_plain = metrics.timed("benchmark")(plain)
+
+def perCall(function) -> float:
+    return min(timeit.repeat(lambda: function(1), number=calls, repeat=5)) / calls
+
+
+if __name__ == "__main__":
+    metrics.enabled = False
+    base = perCall(plain)
+    disabled = perCall(timed_plain)
+    metrics.enabled = True
+    enabled = perCall(timed_plain)
+
+    print(f"{'plain call':<20} {base*1e9:>6.0f}ns")
+    print(f"{'timed, metrics off':<20} {disabled*1e9:>6.0f}ns (+{(disabled - base)*1e9:.0f}ns)")
+    print(f"{'timed, metrics on':<20} {enabled*1e9:>6.0f}ns (+{(enabled - base)*1e9:.0f}ns)")
@@ -0,0 +1,58 @@
+# Compares saving a portfolio refresh with three commits per stock against one WriteBuffer flush
+# Run with "python benchmarks/portfolio_writes.py"
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from write_buffer import WriteBuffer
+
+
+def syntheticDatabase(path: str, holdings: int, wal: bool) -> sqlite3.Connection:
+    connection = sqlite3.connect(path)
+    if wal:
+        connection.execute("PRAGMA journal_mode=WAL;")
+    connection.execute("CREATE TABLE stocks (stock_code TEXT PRIMARY KEY, stock_name TEXT, selling_price NUMERIC, quantity INTEGER, buying_price NUMERIC, last_updated TEXT, currency TEXT NOT NULL ON CONFLICT IGNORE, price_change TEXT);")
+    connection.executemany("INSERT INTO stocks VALUES (?, ?, 0, 1, 100, '', 'USD', '');",
+                           [(f"S{i}", f"Stock {i}") for i in range(holdings)])
+    connection.commit()
+    return connection
+
+def oldCycle(connection: sqlite3.Connection, holdings: int) -> int:
+    # updateStockPrice, updateStockPriceChange and updateStockLastUpdated for every stock
+    commits = 0
+    for i in range(holdings):
+        for sql in [f"UPDATE stocks SET selling_price={100 + i % 7} WHERE stock_code='S{i}';",
+                    f"UPDATE stocks SET price_change='Increase' WHERE stock_code='S{i}';",
+                    f"UPDATE stocks SET last_updated=datetime('now', 'localtime') WHERE stock_code='S{i}';"]:
+            connection.execute(sql)
+            connection.commit()
+            commits += 1
+    return commits
+
+def newCycle(connection: sqlite3.Connection, holdings: int) -> int:
+    write_buffer = WriteBuffer(connection)
+    for i in range(holdings):
+        write_buffer.updateStock(f"S{i}", selling_price=100 + i % 7, price_change="Increase", last_updated="2024-07-20 22:18:23")
+    write_buffer.flush()
+    return 1
+
+def measure(function, connection: sqlite3.Connection, holdings: int) -> 'tuple[int, float]':
+    start = time.perf_counter()
+    commits = function(connection, holdings)
+    return commits, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"{'holdings':>8} {'path':<18} {'commits':>8} {'cycle':>10} {'commits/s':>10} {'rows/s':>10}")
+        for holdings in [10, 100, 1000]:
+            for run, (name, function, wal) in enumerate([("per-row, journal", oldCycle, False), ("per-row, WAL", oldCycle, True), ("batched, WAL", newCycle, True)]):
+                connection = syntheticDatabase(os.path.join(folder, f"stocks_{holdings}_{run}.db"), holdings, wal)
+                commits, seconds = measure(function, connection, holdings)
+                connection.close()
+                print(f"{holdings:>8} {name:<18} {commits:>8} {seconds*1000:>8.1f}ms {commits/seconds:>10.0f} {holdings/seconds:>10.0f}")
@@ -0,0 +1,47 @@
+# Checks that QuoteEngine asks Yahoo for each stock at most once per quote_ttl, against a simulated clock
+# Run with "python benchmarks/quote_cache.py" (exits with an error if the cache lets a repeat request through)
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quotes import QuoteEngine, QuoteCache, quote_ttl
+from scheduler import SimulatedClock
+
+holdings = 20
+lookups_per_second = 5
+
+
+def countingSearch(fetches: 'dict[str, int]'):
+    # Stands in for the network, counting how many times each symbol is asked for
+    def search(URL: str) -> dict:
+        symbols = URL.split("symbols=")[1].split(",")
+        for symbol in symbols:
+            fetches[symbol] = fetches.get(symbol, 0) + 1
+        return {"quoteResponse": {"result": [{"symbol": symbol, "regularMarketPrice": 100} for symbol in symbols]}}
+    return search
+
+def simulate(windows: int) -> 'dict[str, int]':
+    clock = SimulatedClock()
+    fetches = {}
+    engine = QuoteEngine(countingSearch(fetches), cache=QuoteCache(clock=clock))
+    stock_codes = [f"S{i}" for i in range(holdings)]
+
+    # Every stock is looked up several times a second, one at a time and in batches, for windows TTLs
+    while clock() < windows * quote_ttl:
+        for stock_code in stock_codes:
+            assert engine.fetchQuote(stock_code) is not None, f"No quote for {stock_code}"
+        engine.fetchQuotes(stock_codes)
+        clock.advance(1 / lookups_per_second)
+    return fetches
+
+
+if __name__ == "__main__":
+    windows = 10
+    fetches = simulate(windows)
+    assert set(fetches) == {f"S{i}" for i in range(holdings)}, "Some stocks were never fetched"
+    for stock_code, count in fetches.items():
+        assert count == windows, f"{stock_code} was fetched {count} times in {windows} TTL windows, expected {windows}"
+    print(f"{holdings} stocks looked up {lookups_per_second * 2} times a second for {windows * quote_ttl}s: "
+          f"{sum(fetches.values())} upstream fetches, one per stock per {quote_ttl}s")
@@ -0,0 +1,67 @@
+# Compares the cost of saving one stock row with f-string SQL against a cached ? statement, with and without the connection settings in database.py
+# Run with "python benchmarks/row_updates.py"
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import openDatabase, StockRepository
+
+holdings = 1000
+
+
+def formatted(connection: sqlite3.Connection, i: int) -> None:
+    # The old helpers: new SQL text (parsed again) for every row
+    connection.execute(f"UPDATE stocks SET selling_price={100 + i % 7}, last_updated='2024-07-20 22:18:23' WHERE stock_code='S{i % holdings}';")
+
+def parameterised(connection: sqlite3.Connection, i: int) -> None:
+    connection.execute("UPDATE stocks SET selling_price=?, last_updated=? WHERE stock_code=?;", (100 + i % 7, "2024-07-20 22:18:23", f"S{i % holdings}"))
+
+def oldDatabase(path: str) -> sqlite3.Connection:
+    # What the app opened before: default journal and sync settings
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE stocks (stock_code TEXT PRIMARY KEY, stock_name TEXT, selling_price NUMERIC, quantity INTEGER, buying_price NUMERIC, last_updated TEXT, currency TEXT NOT NULL ON CONFLICT IGNORE, price_change TEXT);")
+    connection.executemany("INSERT INTO stocks (stock_code, stock_name, quantity, buying_price, currency) VALUES (?, ?, 1, 100, 'USD');",
+                           [(f"S{i}", f"Stock {i}") for i in range(holdings)])
+    connection.commit()
+    return connection
+
+def newDatabase(path: str) -> sqlite3.Connection:
+    connection = openDatabase(path)
+    StockRepository(connection).insertMany([{"stock_code": f"S{i}", "stock_name": f"Stock {i}", "quantity": 1,
+                                             "buying_price": 100, "currency": "USD"} for i in range(holdings)])
+    return connection
+
+def perRow(connection: sqlite3.Connection, update, rows: int, commit_each: bool) -> float:
+    # Microseconds per row
+    start = time.perf_counter()
+    for i in range(rows):
+        update(connection, i)
+        if commit_each:
+            connection.commit()
+    connection.commit()
+    return (time.perf_counter() - start) / rows * 1e6
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"{'connection':<12} {'statement':<14} {'one commit each':>16} {'one transaction':>16}")
+        for name, opener in [("old", oldDatabase), ("database.py", newDatabase)]:
+            for statement, update in [("f-string", formatted), ("? parameters", parameterised)]:
+                connection = opener(os.path.join(folder, f"{name}_{statement}.db"))
+                each = perRow(connection, update, 300, True)
+                batched = perRow(connection, update, 20000, False)
+                connection.close()
+                print(f"{name:<12} {statement:<14} {each:>14.1f}us {batched:>14.2f}us")
+
+        # Bulk loading a portfolio through the repository
+        connection = openDatabase(os.path.join(folder, "bulk.db"))
+        stocks = [{"stock_code": f"B{i}", "stock_name": f"Stock {i}", "quantity": 1, "buying_price": 100, "currency": "USD"} for i in range(100000)]
+        start = time.perf_counter()
+        StockRepository(connection).insertMany(stocks)
+        print(f"Bulk load of {len(stocks)} stocks (and their lots): {(time.perf_counter() - start)*1000:.0f}ms")
+        connection.close()
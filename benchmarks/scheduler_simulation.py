@@ -0,0 +1,81 @@
+# Runs RefreshScheduler against a simulated clock and compares it to the old fixed 60 second timers
+# Run with "python benchmarks/scheduler_simulation.py"
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import RefreshScheduler, SimulatedClock, watched_interval, max_error_interval
+
+# Simulated portfolio: which stocks trade on a closed market, never move, or always fail
+holdings = 200
+hours = 8
+step = 1
+
+
+def fakeQuote(stock_code: str, now: float) -> 'dict | None':
+    number = int(stock_code[1:])
+    if number % 20 == 0:
+        return None
+    if number % 2 == 0:
+        return {"regularMarketPrice": 100, "marketState": "CLOSED"}
+    if number % 4 == 1:
+        return {"regularMarketPrice": 100, "marketState": "REGULAR"}
+    return {"regularMarketPrice": 100 + now // 60, "marketState": "REGULAR"}
+
+def simulate() -> dict:
+    clock = SimulatedClock()
+    scheduler = RefreshScheduler(clock=clock, random=random.Random(1).random)
+    stock_codes = [f"S{i}" for i in range(holdings)]
+    for stock_code in stock_codes:
+        scheduler.add(stock_code)
+
+    # An info window stays open for one moving stock
+    watched = []
+    scheduler.watch("S3", lambda quote: watched.append(clock()))
+
+    symbol_fetches = {stock_code: 0 for stock_code in stock_codes}
+    requests = 0
+    while clock() < hours * 3600:
+        stock_codes_due = scheduler.dueCodes()
+        if len(stock_codes_due):
+            requests += 1
+            quotes = {}
+            for stock_code in stock_codes_due:
+                symbol_fetches[stock_code] += 1
+                quote = fakeQuote(stock_code, clock())
+                if quote is not None:
+                    quotes[stock_code] = quote
+            scheduler.complete(stock_codes_due, quotes)
+        clock.advance(step)
+
+    gaps = [b - a for a, b in zip(watched, watched[1:])]
+    return {"requests": requests, "symbol_fetches": symbol_fetches, "watched_gap": max(gaps) if gaps else None}
+
+
+if __name__ == "__main__":
+    result = simulate()
+    fetches = result["symbol_fetches"]
+
+    # Every stock once a minute (twice for the watched one), one request each
+    old_fetches = holdings * hours * 60 + hours * 60
+
+    def average(condition) -> float:
+        selected = [count for stock_code, count in fetches.items() if condition(int(stock_code[1:]))]
+        return sum(selected) / len(selected)
+
+    print(f"Simulated {hours} hours with {holdings} stocks")
+    print(f"Old timers:  {old_fetches} requests, {old_fetches} stock fetches")
+    print(f"Scheduler:   {result['requests']} requests, {sum(fetches.values())} stock fetches")
+    print(f"Fetches per stock - moving: {average(lambda n: n % 4 == 3 and n % 20):.0f}, "
+          f"unchanged: {average(lambda n: n % 4 == 1 and n % 20):.0f}, "
+          f"closed market: {average(lambda n: n % 2 == 0 and n % 20):.0f}, "
+          f"always failing: {average(lambda n: n % 20 == 0):.0f}, watched: {fetches['S3']}")
+
+    # Sanity checks on the scheduling rules
+    assert result["watched_gap"] <= watched_interval + step, "Watched stock wasn't refreshed often enough"
+    assert average(lambda n: n % 20 == 0) <= hours * 3600 / max_error_interval * 2 + 5, "Failing stocks didn't back off"
+    assert average(lambda n: n % 2 == 0 and n % 20) < average(lambda n: n % 4 == 3 and n % 20), "Closed markets were polled as often as open ones"
+    print("All scheduling checks passed")
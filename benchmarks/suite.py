@@ -0,0 +1,291 @@
+# Runs every startup, refresh and chart measurement against mock_server.py and synthetic portfolios, and saves them as JSON
+# Run with "python benchmarks/suite.py --output results.json", then "python benchmarks/suite.py --compare old.json new.json"
+# Every case runs in its own process so peak RSS belongs to that case only. The GUI cases need a display and are skipped without one.
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+root_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_folder)
+
+from grid_startup import syntheticDatabase
+
+# Portfolio sizes and how many times each timing is repeated
+default_sizes = [10, 100, 1000]
+repeats = 5
+
+# Chart ranges switched through in the range switch cases
+switch_ranges = [["1d", "1 Day"], ["1mo", "1 Month"], ["1y", "1 Year"], ["5y", "5 Years"], ["max", "Max"]]
+
+# Mouse positions tried in the hover cases
+hover_frames = 200
+
+
+def summarise(times: 'list[float]') -> dict:
+    return {"median": statistics.median(times), "min": min(times), "max": max(times)}
+
+def peakRss() -> int:
+    # Kilobytes on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def refreshCase(path: str, base_url: str) -> dict:
+    # Opening the engine and one full refresh of every stock
+    from engine import PortfolioEngine
+
+    start = time.perf_counter()
+    engine = PortfolioEngine(path, base_url, base_url, "key")
+    opened = time.perf_counter() - start
+
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        engine.refresh()
+        times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    engine.snapshot("GBP")
+    snapshot = time.perf_counter() - start
+    engine.close()
+    return {"open": opened, "refresh": summarise(times), "snapshot": snapshot}
+
+def rangeSwitchCase(path: str, base_url: str) -> dict:
+    # Loading and preparing every range, first from the mock server and then from the stored history
+    import sqlite3
+    from history import HistoryStore
+    from chart_data import prepareChart
+
+    store = HistoryStore(sqlite3.connect(path, check_same_thread=False), fetchJSON, base_url)
+    result = {}
+    for duration, label in switch_ranges:
+        start = time.perf_counter()
+        chart = prepareChart(store.loadChart("S0", duration))
+        first = time.perf_counter() - start
+
+        times = []
+        for i in range(repeats):
+            start = time.perf_counter()
+            prepareChart(store.loadChart("S0", duration))
+            times.append(time.perf_counter() - start)
+        result[duration] = {"points": len(chart["time"]), "first": first, "stored": summarise(times)}
+    return result
+
+def hoverCase(path: str, base_url: str) -> dict:
+    # One hover frame the way StockInfoWindow draws it: find the point, move the annotation and blit it over the saved chart
+    import matplotlib
+    matplotlib.use("Agg")
+    import sqlite3
+    import numpy as np
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.dates import date2num
+    from history import HistoryStore
+    from chart_data import prepareChart, downsampleIndices, nearestIndex
+
+    store = HistoryStore(sqlite3.connect(path, check_same_thread=False), fetchJSON, base_url)
+    result = {}
+    for duration in ["1d", "max"]:
+        chart = prepareChart(store.loadChart("S0", duration))
+        x = date2num(chart["time"])
+        y = chart["close"]
+
+        fig = Figure(figsize=(10, 5), dpi=75)
+        axes = fig.subplots(1, 1)
+        canvas = FigureCanvasAgg(fig)
+        indices = downsampleIndices(chart["filled"]["close"], int(axes.bbox.width))
+        axes.plot(x[indices], chart["filled"]["close"][indices], "-")
+        axes.set_xlim(x[0], x[-1])
+        annot = axes.annotate("", xy=(0, 0), xytext=(-20, 20), textcoords="offset points",
+                              bbox=dict(boxstyle="round", fc="w"), animated=True)
+
+        start = time.perf_counter()
+        canvas.draw()
+        full_draw = time.perf_counter() - start
+        background = canvas.copy_from_bbox(fig.bbox)
+
+        times = []
+        for value in np.linspace(x[0], x[-1], hover_frames):
+            start = time.perf_counter()
+            i = nearestIndex(x, value)
+            annot.xy = (x[i], y[i])
+            annot.set_text(f"{str(chart['time'][i]).replace('T', ' ')}: {round(float(y[i]), 2)}")
+            canvas.restore_region(background)
+            axes.draw_artist(annot)
+            canvas.blit(fig.bbox)
+            times.append(time.perf_counter() - start)
+        result[duration] = {"points": len(x), "full_draw": full_draw, "frame": summarise(times)}
+    return result
+
+def guiCase(path: str, base_url: str) -> dict:
+    # Runs main.py in this process with a mainloop that measures instead of waiting for the user
+    started = time.perf_counter()
+    import importlib
+    import tkinter
+
+    os.chdir(os.path.dirname(path))
+    os.environ["STOCK_TRACKER_YAHOO_URL"] = base_url
+    os.environ["STOCK_TRACKER_EXCHANGE_RATE_URL"] = base_url
+    result = {}
+
+    def waitFor(window, condition, timeout: float = 60) -> float:
+        start = time.perf_counter()
+        while not condition():
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError("The window didn't finish in time")
+            window.update()
+            time.sleep(0.001)
+        return time.perf_counter() - start
+
+    def measure(window) -> None:
+        from portfolio_grid import column_ids
+
+        app = sys.modules["main"]
+        window.update()
+        result["first_paint"] = time.perf_counter() - started
+
+        grid = app.portfolio_grid
+        price = column_ids.index("selling_price")
+        result["refresh_cycle"] = waitFor(window, lambda: all(row[price] != "Loading..." for row in grid.rows.values()))
+
+        start = time.perf_counter()
+        info = app.StockInfoWindow(window, "S0")
+        waitFor(window, lambda: len(info.chart_x) > 0)
+        result["info_window_open"] = time.perf_counter() - start
+
+        switches = {}
+        for chart_range in switch_ranges[1:]:
+            before = info.chart_data
+            info.changeChartRange(chart_range)
+            switches[chart_range[0]] = waitFor(window, lambda: info.chart_data is not before)
+        result["range_switch"] = switches
+
+        # Hover frames on the real (TkAgg) canvas
+        from matplotlib.backend_bases import MouseEvent
+        window.update()
+        times = []
+        for i in range(0, len(info.chart_x), max(len(info.chart_x) // hover_frames, 1)):
+            x, y = info.plot1.transData.transform((info.chart_x[i], info.chart_data["filled"]["close"][i]))
+            event = MouseEvent("motion_notify_event", info.fig.canvas, x, y)
+            start = time.perf_counter()
+            info.hover(event)
+            times.append(time.perf_counter() - start)
+        result["hover_frame"] = summarise(times)
+
+        info.master.destroy()
+
+    def mainloop(self, n: int = 0) -> None:
+        # The info window's own mainloop returns straight away, the main window's runs the measurements
+        if isinstance(self, tkinter.Tk):
+            measure(self)
+
+    tkinter.Misc.mainloop = mainloop
+    importlib.import_module("main")
+    return result
+
+cases = {"refresh": refreshCase, "range_switch": rangeSwitchCase, "hover_agg": hoverCase, "gui": guiCase}
+
+
+def fetchJSON(URL: str) -> dict:
+    from urllib.request import urlopen
+    with urlopen(URL) as response:
+        return json.loads(response.read())
+
+def runCase(name: str, path: str, base_url: str) -> None:
+    # Runs in a child process and prints the results as JSON
+    result = cases[name](path, base_url)
+    result["peak_rss_kb"] = peakRss() // (1024 if sys.platform == "darwin" else 1)
+    print(json.dumps(result))
+
+def hasDisplay() -> bool:
+    try:
+        import tkinter
+        tkinter.Tk().destroy()
+        return True
+    except Exception:
+        return False
+
+def runSuite(sizes: 'list[int]', latency: float) -> dict:
+    from mock_server import startMockServer
+    server, base_url = startMockServer(latency=latency)
+
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=root_folder).stdout.strip()
+    results = {"commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+               "mock_latency": latency, "sizes": {}}
+    display = hasDisplay()
+
+    with tempfile.TemporaryDirectory() as folder:
+        for holdings in sizes:
+            results["sizes"][holdings] = {}
+            for name in cases:
+                if name == "gui" and not display:
+                    results["sizes"][holdings][name] = {"skipped": "no display"}
+                    continue
+
+                # Every case starts from the same fresh database
+                case_folder = os.path.join(folder, f"{name}_{holdings}")
+                os.makedirs(case_folder)
+                path = os.path.join(case_folder, "stocks.db")
+                syntheticDatabase(path, holdings)
+
+                output = subprocess.run([sys.executable, __file__, "--case", name, path, base_url],
+                                        capture_output=True, text=True)
+                if output.returncode != 0:
+                    results["sizes"][holdings][name] = {"error": output.stderr.strip().splitlines()[-1:]}
+                else:
+                    results["sizes"][holdings][name] = json.loads(output.stdout.strip().splitlines()[-1])
+                print(f"{holdings:>6} holdings  {name:<13} done", file=sys.stderr)
+                shutil.rmtree(case_folder)
+
+    server.shutdown()
+    return results
+
+def flatten(result: dict, prefix: str = "") -> 'dict[str, float]':
+    values = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[f"{prefix}{key}"] = value
+    return values
+
+def compare(old_path: str, new_path: str) -> None:
+    # Prints every number in both files with how much it changed (timings are in seconds)
+    with open(old_path, "r") as file:
+        old = flatten(json.load(file)["sizes"])
+    with open(new_path, "r") as file:
+        new = flatten(json.load(file)["sizes"])
+
+    print(f"{'measurement':<48} {'old':>12} {'new':>12} {'change':>8}")
+    for key in sorted(old.keys() & new.keys()):
+        change = f"{(new[key] - old[key]) / old[key] * 100:+.0f}%" if old[key] else ""
+        print(f"{key:<48} {old[key]:>12.4g} {new[key]:>12.4g} {change:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stock Tracker benchmark suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=default_sizes, help="Number of holdings in each synthetic portfolio")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds the mock server waits before every response")
+    parser.add_argument("--output", help="File to save the results to (printed if not given)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two saved results")
+    parser.add_argument("--case", nargs=3, metavar=("NAME", "DATABASE", "URL"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        runCase(*args.case)
+    elif args.compare is not None:
+        compare(*args.compare)
+    else:
+        results = runSuite(args.sizes, args.latency)
+        if args.output is None:
+            print(json.dumps(results, indent=2))
+        else:
+            with open(args.output, "w") as file:
+                json.dump(results, file, indent=2)
@@ -0,0 +1,157 @@
+import re                               # For finding the arrays in chart responses
+import time                             # For the local time zone offset
+from array import array                 # For compact timestamps
+import numpy as np                      # For working on whole chart series at once
+from metrics import timed               # For timing chart preparation when metrics are on
+
+# Seconds between checks for daylight saving changes (they're always months apart)
+offset_check_interval = 7 * 86400
+
+# Columns that hold prices (volume is kept but not drawn)
+price_columns = ["open", "high", "low", "close"]
+
+# Where each array starts in a Yahoo chart response
+result_pattern = re.compile(rb'"result"\s*:\s*\[')
+timestamp_pattern = re.compile(rb'"timestamp"\s*:\s*\[')
+quote_pattern = re.compile(rb'"quote"\s*:\s*\[\s*\{')
+column_patterns = {column: re.compile(rb'"' + column.encode() + rb'"\s*:\s*\[') for column in price_columns + ["volume"]}
+
+
+def localTimes(timestamps: 'list[int]') -> np.ndarray:
+    # Unix timestamps to datetime64 in local time (the same times datetime.fromtimestamp gives)
+    seconds = np.asarray(timestamps, dtype=np.int64)
+    if len(seconds) == 0:
+        return seconds.astype("datetime64[s]")
+
+    # Each bar gets the offset of the daylight saving period it's in
+    changes, offsets = offsetChanges(int(seconds.min()), int(seconds.max()))
+    return (seconds + offsets[np.searchsorted(changes, seconds, side="right")]).astype("datetime64[s]")
+
+def utcOffset(timestamp: int) -> int:
+    return time.localtime(timestamp).tm_gmtoff
+
+def offsetChanges(start: int, end: int) -> 'tuple[np.ndarray, np.ndarray]':
+    # Times the local UTC offset changes between start and end, and the offset before the first and after each one
+    # Offsets are checked once every offset_check_interval and each change is then found to the second
+    points = list(range(start, end, offset_check_interval)) + [end]
+    changes = []
+    offsets = [utcOffset(start)]
+    for before, after in zip(points, points[1:]):
+        if utcOffset(after) == offsets[-1]:
+            continue
+
+        # The first second with the new offset
+        low, high = before, after
+        while high - low > 1:
+            middle = (low + high) // 2
+            if utcOffset(middle) == offsets[-1]:
+                low = middle
+            else:
+                high = middle
+        changes.append(high)
+        offsets.append(utcOffset(after))
+    return np.array(changes, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+def toFloats(values: list) -> np.ndarray:
+    # Missing values (None) become NaN
+    return np.array(values, dtype=np.float64)
+
+def forwardFill(values: np.ndarray) -> np.ndarray:
+    # Replace each NaN with the last value before it (or 0 if there isn't one)
+    missing = np.isnan(values)
+    if not missing.any():
+        return values
+
+    last_valid = np.where(missing, 0, np.arange(len(values)))
+    np.maximum.accumulate(last_valid, out=last_valid)
+    filled = values[last_valid]
+    filled[np.isnan(filled)] = 0
+    return filled
+
+def numberArray(body: bytes, start: int) -> np.ndarray:
+    # Parses the JSON number array starting at start (just after the "[") without making a Python float for each number
+    end = body.index(b"]", start)
+    text = body[start:end]
+    if text.strip() == b"":
+        return np.empty(0)
+    return np.fromstring(text.replace(b"null", b"nan"), dtype=np.float64, sep=",")
+
+def decodeChart(body: bytes) -> dict:
+    # Reads only the timestamps and indicators.quote[0] out of a /v8/finance/chart response, skipping everything else
+    # Returns the timestamps as array("q") and every column as a float64 array with NaN for missing values
+    if result_pattern.search(body) is None:
+        raise ValueError("The response doesn't contain a chart")
+
+    match = timestamp_pattern.search(body)
+    if match is None:
+        return {"timestamp": array("q"), **{column: np.empty(0) for column in column_patterns}}
+    timestamps = array("q", numberArray(body, match.end()).astype(np.int64).tobytes())
+
+    # The columns are searched for between the start and end of the first quote object (numbers never contain "}")
+    quote = quote_pattern.search(body, match.end()) or quote_pattern.search(body)
+    if quote is None:
+        raise ValueError("The response doesn't contain any prices")
+    quote_end = body.index(b"}", quote.end())
+
+    chart = {"timestamp": timestamps}
+    for column, pattern in column_patterns.items():
+        found = pattern.search(body, quote.end(), quote_end)
+        chart[column] = numberArray(body, found.end()) if found is not None else np.full(len(timestamps), np.nan)
+    return chart
+
+def valueRange(series: 'list[np.ndarray]') -> 'tuple[float, float] | None':
+    # Lowest and highest value over every series, without NaNs
+    values = [values for values in series if len(values)]
+    if len(values) == 0:
+        return None
+
+    values = np.concatenate(values)
+    if np.isnan(values).all():
+        return None
+    return float(np.nanmin(values)), float(np.nanmax(values))
+
+@timed("chart.prepare")
+def prepareChart(chart: dict) -> dict:
+    # Turns a chart from HistoryStore.loadChart into arrays ready to be plotted
+    prepared = {"time": localTimes(chart["timestamp"]), "filled": {}}
+    for column in price_columns + ["volume"]:
+        prepared[column] = toFloats(chart[column])
+    for column in price_columns:
+        prepared["filled"][column] = forwardFill(prepared[column])
+    return prepared
+
+def emptyChart() -> dict:
+    return prepareChart({"timestamp": [], **{column: [] for column in price_columns + ["volume"]}})
+
+def downsampleIndices(values: np.ndarray, buckets: int) -> np.ndarray:
+    # Keeps the first, last, lowest and highest point of each bucket so spikes don't disappear
+    points = len(values)
+    if buckets <= 0 or points <= buckets * 2:
+        return np.arange(points)
+
+    size = -(-points // buckets)
+    padded = np.empty(size * -(-points // size))
+    padded[:points] = values
+    padded[points:] = values[-1]
+    padded[np.isnan(padded)] = np.nanmean(values) if not np.isnan(values).all() else 0
+    rows = padded.reshape(-1, size)
+
+    offsets = np.arange(len(rows)) * size
+    indices = np.concatenate([offsets, offsets + rows.argmin(axis=1), offsets + rows.argmax(axis=1), [points - 1]])
+    return np.unique(np.minimum(indices, points - 1))
+
+def visibleSlice(x: np.ndarray, xmin: float, xmax: float) -> 'tuple[int, int]':
+    # Start and stop indices of the points between xmin and xmax, plus one either side so lines reach the edges
+    start = max(int(np.searchsorted(x, xmin, side="left")) - 1, 0)
+    stop = min(int(np.searchsorted(x, xmax, side="right")) + 1, len(x))
+    return start, stop
+
+def nearestIndex(x: np.ndarray, value: float) -> 'int | None':
+    # Index of the point in x closest to value
+    if len(x) == 0:
+        return None
+
+    i = int(np.searchsorted(x, value))
+    if i == len(x) or (i > 0 and value - x[i-1] < x[i] - value):
+        i -= 1
+    return i
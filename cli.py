@@ -0,0 +1,196 @@
+# Refreshes the portfolio without opening a window and prints or saves a snapshot
+# Run with "python cli.py --help" to see the options, "python cli.py --gui" opens the normal app
+
+import argparse
+import csv
+import importlib
+import json
+import math
+import sys
+import time
+
+import engine
+import metrics
+from alerts import LogSink, WebhookSink, alert_metrics, alert_directions, describeAlert
+from http_client import client
+from replay import ReplayTransport
+
+
+def formatTable(snapshot: dict) -> str:
+    rows = [[str(column) for column in engine.snapshot_columns]]
+    for stock in snapshot["stocks"]:
+        rows.append(["Error" if stock[column] is None else str(stock[column]) for column in engine.snapshot_columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(engine.snapshot_columns))]
+
+    lines = ["  ".join(row[i].ljust(widths[i]) for i in range(len(row))) for row in rows]
+    totals = snapshot["totals"]
+    lines.append("")
+    lines.append(f"Total Value: {totals['value']:,.2f} {totals['currency']}    Profit/Loss: {totals['profit_loss']:,.2f} {totals['currency']}")
+    if totals["missing"]:
+        lines.append(f"({totals['missing']} stocks not counted)")
+    if "analytics" in snapshot:
+        lines.append("")
+        lines.extend(formatAnalytics(snapshot["analytics"], totals["currency"]))
+    return "\n".join(lines)
+
+def percent(value: 'float | None', sign: str = "+") -> str:
+    return "-" if value is None else f"{value:{sign}.2%}"
+
+def formatAnalytics(analytics: dict, currency: str) -> 'list[str]':
+    lines = [f"{'stock_code':<12} {'return':>8} {'volatility':>10} {'drawdown':>9} {'max_drawdown':>12}"]
+    for stock_code, summary in analytics["holdings"].items():
+        if summary["bars"] == 0:
+            lines.append(f"{stock_code:<12} no history")
+            continue
+        lines.append(f"{stock_code:<12} {percent(summary['return']):>8} {percent(summary['volatility'], ''):>10} "
+                     f"{percent(summary['drawdown']):>9} {percent(summary['max_drawdown']):>12}")
+
+    portfolio = analytics["portfolio"]
+    if portfolio["bars"]:
+        lines.append("")
+        lines.append(f"Portfolio ({currency}): return {percent(portfolio['return'])}  volatility {percent(portfolio['volatility'], '')}  "
+                     f"max drawdown {percent(portfolio['max_drawdown'])}")
+    return lines
+
+def withoutNaN(value):
+    # NaN (not enough bars yet) isn't valid JSON, so it's saved as null
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, dict):
+        return {key: withoutNaN(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [withoutNaN(item) for item in value]
+    return value
+
+def writeSnapshot(snapshot: dict, output_format: str, file) -> None:
+    if output_format == "json":
+        json.dump(withoutNaN(snapshot), file, indent=2)
+        file.write("\n")
+    elif output_format == "csv":
+        writer = csv.DictWriter(file, fieldnames=engine.snapshot_columns)
+        writer.writeheader()
+        writer.writerows(snapshot["stocks"])
+    else:
+        file.write(formatTable(snapshot) + "\n")
+
+def holdingCode(portfolio_engine: engine.PortfolioEngine, stock_code: str) -> str:
+    # Rules have to use the code exactly as it's saved in the portfolio, which may not be upper case
+    for code in portfolio_engine.portfolio.codes():
+        if code.upper() == stock_code.upper():
+            return code
+    return stock_code.upper()
+
+def printAlerts(alerts: 'list[dict]') -> None:
+    for alert in alerts:
+        print(f"Alert: {describeAlert(alert)}", file=sys.stderr)
+
+def parseArguments(arguments: 'list[str]') -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Refresh the portfolio and print or save a snapshot")
+    parser.add_argument("--gui", action="store_true", help="Open the app instead (the other options are ignored)")
+    parser.add_argument("--db", default=engine.file_name, help="Portfolio database")
+    parser.add_argument("--currency", default="USD", help="Currency for the total value and profit/loss")
+    parser.add_argument("--format", choices=["table", "csv", "json"], default="table")
+    parser.add_argument("--output", help="File to save the snapshot to instead of printing it")
+    parser.add_argument("--no-refresh", action="store_true", help="Only show the last saved values")
+    parser.add_argument("--record", metavar="FOLDER", help="Save every web response in FOLDER")
+    parser.add_argument("--replay", metavar="FOLDER", help="Serve web responses from FOLDER instead of going online")
+    parser.add_argument("--latency", type=float, default=0, help="Seconds added to every replayed response")
+    parser.add_argument("--error-rate", type=float, default=0, help="How often (0 to 1) a replayed request fails")
+    parser.add_argument("--seed", type=int, help="Makes injected errors the same every run")
+    parser.add_argument("--yahoo-url", default=engine.yahoo_url)
+    parser.add_argument("--exchange-rate-url", default=engine.exchange_rate_url)
+    parser.add_argument("--analytics", action="store_true", help="Add returns, volatility, drawdown and correlation from each stock's daily history")
+    parser.add_argument("--add-alert", nargs=4, action="append", default=[], metavar=("CODE", "METRIC", "DIRECTION", "THRESHOLD"),
+                        help=f"Save an alert rule, METRIC is one of {', '.join(alert_metrics)} and DIRECTION is above or below")
+    parser.add_argument("--remove-alert", type=int, action="append", default=[], metavar="ID", help="Delete a saved alert rule")
+    parser.add_argument("--list-alerts", action="store_true", help="Print the saved alert rules")
+    parser.add_argument("--alert-log", metavar="FILE", help="Also append triggered alerts to FILE (one JSON object per line)")
+    parser.add_argument("--alert-webhook", metavar="URL", help="Also post triggered alerts to URL as JSON")
+    parser.add_argument("--timing", action="store_true", help="Print how long each step took")
+    parser.add_argument("--metrics", action="store_true", help="Print p50/p95 timings, request counts and cache hit rates")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], help="Profile the whole run")
+    parser.add_argument("--profile-output", default="cli.prof", help="File the profile is saved to")
+    return parser.parse_args(arguments)
+
+def main(arguments: 'list[str]') -> int:
+    started = time.perf_counter()
+    args = parseArguments(arguments)
+
+    if args.gui:
+        # tkinter and matplotlib are only loaded here, the window runs until it's closed
+        importlib.import_module("main")
+        return 0
+
+    metrics.enabled = metrics.enabled or args.metrics
+    profiler = None if args.profile is None else metrics.Profiler(args.profile, args.profile_output)
+
+    api_key = engine.readApiKey()
+    transport = None
+    if args.record is not None:
+        transport = ReplayTransport(args.record, "record", client.getJSON, secrets=[api_key])
+    elif args.replay is not None:
+        transport = ReplayTransport(args.replay, "replay", latency=args.latency, error_rate=args.error_rate,
+                                    seed=args.seed, secrets=[api_key])
+
+    portfolio_engine = engine.PortfolioEngine(args.db, args.yahoo_url, args.exchange_rate_url, api_key, transport)
+    opened = time.perf_counter()
+
+    # Rules are checked during the refresh, every run starts fresh so rules that are already met trigger too
+    alerts = portfolio_engine.alerts
+    for stock_code, metric, direction, threshold in args.add_alert:
+        if metric not in alert_metrics or direction not in alert_directions:
+            print(f"Unknown alert {metric} {direction}, expected one of {', '.join(alert_metrics)} and above or below", file=sys.stderr)
+            return 2
+        try:
+            threshold = float(threshold)
+        except ValueError:
+            print(f"Alert threshold {threshold} isn't a number", file=sys.stderr)
+            return 2
+        alerts.addRule(holdingCode(portfolio_engine, stock_code), metric, direction, threshold)
+    for alert_id in args.remove_alert:
+        alerts.removeRule(alert_id)
+    if args.list_alerts:
+        for rule in alerts.stockRules():
+            print(f"{rule['alert_id']:>6}  {describeAlert(rule)}", file=sys.stderr)
+
+    alerts.subscribe(printAlerts)
+    if args.alert_log is not None:
+        alerts.subscribe(LogSink(args.alert_log))
+    webhook = None
+    if args.alert_webhook is not None:
+        webhook = WebhookSink(args.alert_webhook)
+        alerts.subscribe(webhook)
+
+    all_successful = True
+    if not args.no_refresh:
+        all_successful = portfolio_engine.refresh()
+    refreshed = time.perf_counter()
+
+    snapshot = portfolio_engine.snapshot(args.currency.upper())
+    if args.analytics:
+        portfolio_engine.refreshAnalytics()
+        snapshot["analytics"] = withoutNaN(portfolio_engine.analyticsSummary(args.currency.upper()))
+    if args.output is None:
+        writeSnapshot(snapshot, args.format, sys.stdout)
+    else:
+        with open(args.output, "w", newline="") as file:
+            writeSnapshot(snapshot, args.format, file)
+    if webhook is not None:
+        webhook.close()
+    portfolio_engine.close()
+
+    if args.timing:
+        print(f"Startup: {(opened - started)*1000:.0f}ms  Refresh: {(refreshed - opened)*1000:.0f}ms  "
+              f"Snapshot: {(time.perf_counter() - refreshed)*1000:.0f}ms", file=sys.stderr)
+        if transport is not None:
+            print(transport.stats(), file=sys.stderr)
+    metrics.printSummary()
+    if profiler is not None:
+        print(f"Profile saved to {profiler.stop()}", file=sys.stderr)
+
+    # Stocks that couldn't be refreshed are shown with their saved values, the exit code says so
+    return 0 if all_successful else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
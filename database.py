@@ -0,0 +1,171 @@
+import sqlite3                          # For database management
+from metrics import timed               # For timing the data layer when metrics are on
+
+# Settings applied to every connection
+# Readers don't block the writer, commits only wait for the WAL to be written (not synced to disk) and reads are memory mapped
+pragmas = ["PRAGMA journal_mode=WAL;", "PRAGMA synchronous=NORMAL;", "PRAGMA mmap_size=67108864;", "PRAGMA temp_store=MEMORY;"]
+
+# Prepared statements kept by each connection, every statement below is the same text each time so they're parsed once
+cached_statements = 256
+
+# Every change to the schema, in order. The database's user_version is the number of them that have been applied.
+# Tables may already exist from before versions were recorded, so everything here must be safe to run on them.
+migrations = [
+    # 1: the portfolio
+    """
+    CREATE TABLE IF NOT EXISTS stocks (stock_code TEXT PRIMARY KEY, stock_name TEXT, selling_price NUMERIC, quantity INTEGER, buying_price NUMERIC, last_updated TEXT, currency TEXT NOT NULL ON CONFLICT IGNORE, price_change TEXT);
+    """,
+    # 2: chart history (HistoryStore)
+    """
+    CREATE TABLE IF NOT EXISTS price_history (
+        stock_code TEXT NOT NULL,
+        interval TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
+        open REAL, high REAL, low REAL, close REAL, volume REAL,
+        PRIMARY KEY (stock_code, interval, timestamp)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS price_history_coverage (
+        stock_code TEXT NOT NULL,
+        interval TEXT NOT NULL,
+        start INTEGER NOT NULL,
+        fetched_at INTEGER NOT NULL,
+        PRIMARY KEY (stock_code, interval)
+    ) WITHOUT ROWID;
+    """,
+    # 3: exchange rates (RateTable)
+    """
+    CREATE TABLE IF NOT EXISTS exchange_rates (
+        base TEXT NOT NULL,
+        currency TEXT NOT NULL,
+        rate REAL NOT NULL,
+        fetched_at INTEGER NOT NULL,
+        PRIMARY KEY (base, currency)
+    ) WITHOUT ROWID;
+    """,
+    # 4: each purchase of a stock, starting with one lot per stock already in the portfolio
+    """
+    CREATE TABLE IF NOT EXISTS lots (
+        lot_id INTEGER PRIMARY KEY,
+        stock_code TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        buying_price NUMERIC NOT NULL,
+        currency TEXT NOT NULL,
+        bought_at TEXT
+    );
+    CREATE INDEX IF NOT EXISTS lots_by_stock ON lots (stock_code);
+    INSERT INTO lots (stock_code, quantity, buying_price, currency)
+        SELECT stock_code, quantity, buying_price, currency FROM stocks
+        WHERE quantity IS NOT NULL AND buying_price IS NOT NULL AND stock_code NOT IN (SELECT stock_code FROM lots);
+    """,
+    # 5: alert rules (AlertEngine)
+    """
+    CREATE TABLE IF NOT EXISTS alerts (
+        alert_id INTEGER PRIMARY KEY,
+        stock_code TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        direction TEXT NOT NULL,
+        threshold REAL NOT NULL,
+        created_at TEXT
+    );
+    CREATE INDEX IF NOT EXISTS alerts_by_stock ON alerts (stock_code);
+    """,
+]
+
+
+def schemaVersion(connection: sqlite3.Connection) -> int:
+    return connection.execute("PRAGMA user_version;").fetchone()[0]
+
+def migrate(connection: sqlite3.Connection) -> int:
+    # Applies every migration the database doesn't have yet, returns the number applied
+    applied = 0
+    while schemaVersion(connection) < len(migrations):
+        # Each migration and its version number are saved together, so a failed one can be run again
+        connection.commit()
+        connection.execute("BEGIN IMMEDIATE;")
+        try:
+            # Another connection may have applied it while this one was waiting for the lock
+            version = schemaVersion(connection)
+            if version < len(migrations):
+                for statement in splitStatements(migrations[version]):
+                    connection.execute(statement)
+                connection.execute(f"PRAGMA user_version={version + 1};")
+                applied += 1
+            connection.commit()
+        except:
+            connection.rollback()
+            raise
+    return applied
+
+def splitStatements(script: str) -> 'list[str]':
+    # executescript() would commit the transaction part way through, so statements are run one at a time
+    statements = []
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            statements.append(statement.strip())
+            statement = ""
+    return [statement for statement in statements if statement]
+
+def openDatabase(filename: str) -> sqlite3.Connection:
+    # The connection is shared with the background database thread
+    connection = sqlite3.connect(filename, check_same_thread=False, cached_statements=cached_statements)
+    connection.row_factory = sqlite3.Row
+
+    for pragma in pragmas:
+        connection.execute(pragma)
+    migrate(connection)
+    return connection
+
+@timed("db.read")
+def readDatabase(connection: sqlite3.Connection, sql: str, parameters: tuple = ()) -> 'list[dict]':
+    cursor = connection.cursor()
+    cursor.execute(sql, parameters)
+    result = [ dict(row) for row in cursor.fetchall() ]
+    return result
+
+@timed("db.write")
+def writeDatabase(connection: sqlite3.Connection, sql: str, parameters: tuple = ()) -> int:
+    cursor = connection.cursor()
+    rows_affected = cursor.execute(sql, parameters).rowcount
+    connection.commit()
+    return rows_affected
+
+def closeDatabase(connection: sqlite3.Connection) -> None:
+    connection.close()
+
+
+class StockRepository():
+    # Every read and write of the stocks and lots tables, always with ? parameters so each statement is prepared once
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+
+    def all(self) -> 'list[dict]':
+        return readDatabase(self.connection, "SELECT * FROM stocks;")
+
+    def get(self, stock_code: str) -> 'dict | None':
+        rows = readDatabase(self.connection, "SELECT * FROM stocks WHERE stock_code=?;", (stock_code,))
+        return rows[0] if len(rows) else None
+
+    def insert(self, stock: dict) -> None:
+        self.insertMany([stock])
+
+    @timed("db.write")
+    def insertMany(self, stocks: 'list[dict]') -> int:
+        # Bulk loads are one transaction and one prepared statement however many stocks there are
+        with self.connection:
+            self.connection.executemany("INSERT INTO stocks (stock_code, stock_name, quantity, buying_price, currency) VALUES (?, ?, ?, ?, ?);",
+                                        [(stock["stock_code"], stock["stock_name"], stock["quantity"], stock["buying_price"], stock["currency"])
+                                         for stock in stocks])
+            self.connection.executemany("INSERT INTO lots (stock_code, quantity, buying_price, currency, bought_at) VALUES (?, ?, ?, ?, datetime('now', 'localtime'));",
+                                        [(stock["stock_code"], stock["quantity"], stock["buying_price"], stock["currency"]) for stock in stocks])
+        return len(stocks)
+
+    @timed("db.write")
+    def delete(self, stock_code: str) -> int:
+        with self.connection:
+            self.connection.execute("DELETE FROM lots WHERE stock_code=?;", (stock_code,))
+            return self.connection.execute("DELETE FROM stocks WHERE stock_code=?;", (stock_code,)).rowcount
+
+    def lots(self, stock_code: str) -> 'list[dict]':
+        return readDatabase(self.connection, "SELECT * FROM lots WHERE stock_code=? ORDER BY lot_id;", (stock_code,))
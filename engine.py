@@ -0,0 +1,311 @@
+from datetime import datetime           # For getting the current date and time
+import numpy as np                      # For passing chart history to the analytics
+from database import StockRepository, openDatabase, closeDatabase   # For reading and writing the portfolio
+from quotes import QuoteEngine          # For fetching the whole portfolio's quotes at once
+from http_client import client          # For making web requests over shared connections
+from history import HistoryStore, chart_intervals   # For storing chart data locally
+from write_buffer import WriteBuffer, stock_columns    # For saving a whole refresh in one transaction
+from portfolio import Portfolio         # For keeping track of the stocks while running
+from fx import RateTable, portfolioTotals   # For converting between currencies without a request each time
+from alerts import AlertEngine          # For alert rules checked against every refresh
+from analytics import PortfolioAnalytics, history_range   # For returns, volatility and drawdown over the chart history
+from metrics import metrics, timed      # For timing the data layer when metrics are on
+
+# Defaults used when nothing else is given (main.py and cli.py can change them)
+file_name = "stocks.db"
+yahoo_url = "https://query2.finance.yahoo.com"
+exchange_rate_url = "https://v6.exchangerate-api.com"
+
+# Columns in a snapshot, in the same order as the table in the app
+snapshot_columns = ["stock_code", "stock_name", "currency", "selling_price", "quantity", "buying_price",
+                    "price_change", "profit_loss", "last_updated"]
+
+
+class StockNotFoundError(Exception):
+    pass
+
+
+def readApiKey(filename: str = "secrets.txt") -> str:
+    # API keys (stored in secrets.txt)
+    try:
+        with open(filename, "r") as file:
+            return file.readline().strip()
+    except:
+        return "Error"
+
+
+def profitLoss(stock: dict, selling_price: float) -> 'float | None':
+    # In the stock's trading currency, None if it can't be worked out
+    try:
+        return round(((float(selling_price) * int(stock["quantity"])) - float(stock["buying_price"])), 2)
+    except:
+        return None
+
+
+class PortfolioEngine():
+    def __init__(self, filename: str = file_name, yahoo_url: str = yahoo_url, exchange_rate_url: str = exchange_rate_url,
+                 exchange_rate_api_key: str = None, transport=None) -> None:
+        # Everything the app does without a window: the database, web requests and the profit/loss maths
+        # transport replaces the network when given (e.g. a ReplayTransport), it needs a getJSON(URL) method
+        self.transport = transport
+
+        self.connection = openDatabase(filename)
+        self.stocks = StockRepository(self.connection)
+        self.portfolio = Portfolio(self.stocks.all())
+        self.write_buffer = WriteBuffer(self.connection)
+
+        # Quotes are shared between the portfolio and the fetch helpers below
+        self.quote_engine = QuoteEngine(self.search, yahoo_url)
+
+        # Chart history has its own connection so it can be loaded while the portfolio is being saved
+        self.history_store = HistoryStore(openDatabase(filename), self.search, yahoo_url, self.searchBytes)
+
+        # Analytics are kept between refreshes so only new bars are added each time
+        self.analytics = PortfolioAnalytics(chart_intervals[history_range])
+
+        # Alert rules are saved with the portfolio, triggered alerts are sent to whatever subscribes to them
+        self.alerts = AlertEngine(self.connection)
+
+        # Exchange rates are saved with the portfolio so they still work offline
+        api_key = readApiKey() if exchange_rate_api_key is None else exchange_rate_api_key
+        self.rate_table = RateTable(openDatabase(filename), self.search, exchange_rate_url, api_key)
+
+        # Every change to a stock's values is saved with the next flush
+        self.portfolio.subscribe("update", self.saveStockUpdate)
+
+        # Shown with the timings when metrics are on
+        metrics.addSource("quote_cache", self.quote_engine.cache.stats)
+        metrics.addSource("http", client.stats)
+        metrics.addSource("alerts", self.alerts.stats)
+        if transport is not None:
+            metrics.addSource("replay", transport.stats)
+
+    @timed("search")
+    def search(self, URL: str) -> dict:
+        # Search the given link and return the data in a dictionary
+        if self.transport is not None:
+            return self.transport.getJSON(URL)
+        return client.getJSON(URL)
+
+    @timed("search")
+    def searchBytes(self, URL: str) -> bytes:
+        # Same as search(), but the body isn't decoded (for chart responses, which only need a few arrays)
+        if self.transport is not None:
+            return self.transport.getBytes(URL)
+        return client.getBytes(URL)
+
+    @timed("fetch.stock_name")
+    def fetchStockName(self, stock_code: str) -> str:
+        # Get the stock's name
+        try:
+            name = self.quote_engine.fetchQuote(stock_code)["shortName"]
+        except:
+            name = "Error"
+
+        return name
+
+    @timed("fetch.stock_currency")
+    def fetchStockCurrency(self, stock_code: str) -> str:
+        # Get the stock's trading currency
+        try:
+            currency = self.quote_engine.fetchQuote(stock_code)["currency"]
+        except:
+            currency = "Error"
+
+        return currency
+
+    @timed("fetch.exchange_rate")
+    def fetchExchangeRate(self, currency1: str, currency2: str) -> 'float | str':
+        # Get the exchange rate between two currencies (the rate table is only downloaded when it's too old)
+        self.rate_table.refresh()
+        try:
+            rate = self.rate_table.rate(currency1, currency2)
+        except:
+            rate = "Error"
+
+        return rate
+
+    @timed("fetch.new_stock")
+    def fetchNewStock(self, code: str, price: float, quantity: int, currency: str) -> dict:
+        # Runs in the background, converts the price paid into the stock's trading currency
+        true_currency = self.fetchStockCurrency(code)
+
+        if true_currency != "Error":
+            exchange_rate = self.fetchExchangeRate(currency, true_currency)
+            if exchange_rate != "Error":
+                price *= exchange_rate
+                currency = true_currency
+
+        return {"stock_code": code, "stock_name": self.fetchStockName(code), "selling_price": None, "quantity": quantity, "buying_price": price,
+                "last_updated": None, "currency": currency, "price_change": None}
+
+    def insertStock(self, stock: dict) -> None:
+        # Add to the database
+        self.stocks.insert(stock)
+
+    def deleteStock(self, stock: dict) -> None:
+        # Remove from database
+        self.stocks.delete(stock["stock_code"])
+        self.analytics.remove(stock["stock_code"])
+        self.alerts.removeStock(stock["stock_code"])
+
+    def getLiveStockData(self, stock: dict, quote: 'dict | None') -> bool:
+        # Work out the latest values for a stock, returns False if it needs to be fetched again sooner
+        stock_code = stock["stock_code"]
+        values = {}
+
+        try:
+            if stock["stock_name"] == "Error":
+                raise StockNotFoundError
+
+            # The stock was missing from the batch response
+            if quote is None:
+                raise KeyError(stock_code)
+
+            # For stock price
+            values["selling_price"] = float(quote["regularMarketPrice"])
+
+            # For stock price change
+            stock_price_change = quote["regularMarketChangePercent"]
+
+            if stock_price_change > 0:
+                values["price_change"] = "Increase"
+            elif stock_price_change < 0:
+                values["price_change"] = "Decrease"
+            else:
+                values["price_change"] = "No change"
+
+            # For profit/loss calculation
+            values["profit_loss"] = profitLoss(stock, values["selling_price"])
+
+            # For last updated time
+            values["last_updated"] = str(datetime.now()).split(".")[0]
+
+            self.portfolio.update(stock_code, values)
+            return True
+        except StockNotFoundError:
+            self.portfolio.update(stock_code, {"selling_price": None, "price_change": None, "profit_loss": None, "last_updated": None})
+
+            # Stocks that don't exist never need to be fetched again
+            return True
+        except:
+            # Keep showing the last saved values
+            return False
+
+    @timed("engine.apply_quotes")
+    def applyQuotes(self, quotes: 'dict[str, dict]', stock_codes: 'list[str]') -> bool:
+        # Updates every stock from one batch of quotes, returns False if any of them failed
+        all_successful = True
+        changes = {}
+        for stock_code in stock_codes:
+            stock = self.portfolio.get(stock_code)
+
+            # Removed while the quotes were being fetched
+            if stock is None:
+                continue
+
+            before = (stock.get("selling_price"), stock.get("profit_loss"))
+            if not self.getLiveStockData(stock, quotes.get(stock_code)):
+                all_successful = False
+            elif self.alerts.watches(stock_code):
+                stock = self.portfolio.get(stock_code)
+                if (stock.get("selling_price"), stock.get("profit_loss")) != before:
+                    changes[stock_code] = self.alertValues(stock, quotes.get(stock_code))
+
+        # Only stocks with alert rules whose price or profit/loss changed are checked
+        if len(changes):
+            self.alerts.evaluate(changes)
+        return all_successful
+
+    def alertValues(self, stock: dict, quote: 'dict | None') -> 'dict[str, float | None]':
+        # The values alert rules are checked against, None for ones that couldn't be worked out
+        values = {"price": stock.get("selling_price"), "profit_loss": stock.get("profit_loss"), "move": None}
+        try:
+            values["move"] = (float(stock["selling_price"]) / float(quote["regularMarketOpen"]) - 1) * 100
+        except:
+            pass
+        return values
+
+    def saveStockUpdate(self, stock_code: str, values: dict) -> None:
+        # Values that couldn't be worked out (None) keep whatever is saved
+        columns = {column: values[column] for column in stock_columns if values.get(column) is not None}
+        if len(columns):
+            self.write_buffer.updateStock(stock_code, **columns)
+
+    def totals(self, currency: str) -> dict:
+        return portfolioTotals(self.rate_table, list(self.portfolio), currency)
+
+    @timed("engine.refresh")
+    def refresh(self) -> bool:
+        # Fetches every stock at once and saves the results, blocking until it's done
+        stock_codes = []
+        for stock in self.portfolio:
+            if stock["stock_name"] == "Error":
+                self.getLiveStockData(stock, None)
+            else:
+                stock_codes.append(stock["stock_code"])
+
+        try:
+            quotes = self.quote_engine.fetchQuotes(stock_codes, True) if len(stock_codes) else {}
+        except:
+            quotes = {}
+
+        all_successful = self.applyQuotes(quotes, stock_codes)
+        self.write_buffer.flush()
+        self.rate_table.refresh()
+        return all_successful
+
+    @timed("engine.refresh_analytics")
+    def refreshAnalytics(self) -> int:
+        # Loads each holding's daily history (only new bars are downloaded and added), returns the number of new bars
+        new_bars = 0
+        for stock in self.portfolio:
+            if stock["stock_name"] != "Error":
+                new_bars += self.refreshHoldingAnalytics(stock["stock_code"])
+        return new_bars
+
+    def refreshHoldingAnalytics(self, stock_code: str) -> int:
+        # The same for one holding, so the window can refresh them one at a time
+        chart = self.history_store.loadChart(stock_code, history_range)
+
+        # Removed while its chart was loading
+        if stock_code not in self.portfolio:
+            return 0
+        return self.analytics.update(stock_code, chart["timestamp"], [np.nan if close is None else close for close in chart["close"]])
+
+    def analyticsSummary(self, currency: str) -> dict:
+        # Every holding's analytics plus the whole portfolio's, valued in one currency
+        holdings = {}
+        weights = {}
+        for stock in self.portfolio:
+            stock_code = stock["stock_code"]
+            if stock_code not in self.analytics.holdings:
+                continue
+            holdings[stock_code] = self.analytics.summary(stock_code)
+            try:
+                weights[stock_code] = int(stock["quantity"]) * self.rate_table.rate(stock["currency"], currency)
+            except:
+                # Without a rate the holding can't be added to the portfolio's value
+                pass
+
+        codes, correlation = self.analytics.correlation()
+        return {"holdings": holdings, "portfolio": self.analytics.portfolioSummary(weights),
+                "correlation": {"codes": codes, "matrix": correlation.tolist()}}
+
+    def snapshot(self, currency: str) -> dict:
+        # Every stock's values plus the totals, ready to be printed or saved
+        rows = []
+        for stock in self.portfolio:
+            row = {column: stock.get(column) for column in snapshot_columns}
+
+            # Profit/loss isn't saved, so work it out from the saved price until the stock is refreshed
+            if "profit_loss" not in stock:
+                row["profit_loss"] = profitLoss(stock, stock["selling_price"])
+            rows.append(row)
+        return {"stocks": rows, "totals": self.totals(currency)}
+
+    def close(self) -> None:
+        closeDatabase(self.connection)
+        closeDatabase(self.history_store.connection)
+        closeDatabase(self.rate_table.connection)
+        client.close()
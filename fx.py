@@ -0,0 +1,127 @@
+import sqlite3                          # For storing exchange rates
+import threading                        # For refreshing rates from more than one thread
+import time                             # For working out when the rates are too old
+import numpy as np                      # For converting the whole portfolio at once
+from metrics import timed               # For timing conversions when metrics are on
+from database import migrate            # For creating the exchange rates table
+
+# Every rate is stored against this currency, any other pair is worked out from two of them
+base_currency = "USD"
+
+# Seconds before the stored rates are downloaded again
+rates_ttl = 3600
+
+# Seconds to wait before trying again after a failed download
+retry_interval = 300
+
+
+class RateTable():
+    def __init__(self, connection: sqlite3.Connection, search, base_url: str, api_key: str,
+                 base: str = base_currency, ttl: float = rates_ttl, clock=time.time) -> None:
+        self.connection = connection
+        self.search = search
+        self.base_url = base_url
+        self.api_key = api_key
+        self.base = base
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        # The exchange_rates table is created by the same migrations as the portfolio's
+        migrate(self.connection)
+
+        # currency -> units of it per 1 of the base currency
+        self.rates = {}
+        self.fetched_at = None
+        self.retry_at = 0
+        self.fetch_count = 0
+        self.load()
+
+    def load(self) -> None:
+        # Start from the last saved table so rates work offline
+        rows = self.connection.execute("SELECT currency, rate, fetched_at FROM exchange_rates WHERE base=?;", (self.base,)).fetchall()
+        self.rates = {row[0]: row[1] for row in rows}
+        self.fetched_at = min([row[2] for row in rows], default=None)
+
+    def isStale(self) -> bool:
+        now = self.clock()
+        return now >= self.retry_at and (self.fetched_at is None or now - self.fetched_at >= self.ttl)
+
+    @timed("fx.refresh")
+    def refresh(self, force: bool = False) -> bool:
+        # Downloads a new table if the stored one is too old, returns True if the rates changed
+        with self.lock:
+            if not force and not self.isStale():
+                return False
+
+            URL = f"{self.base_url}/v6/{self.api_key}/latest/{self.base}"
+            self.fetch_count += 1
+            try:
+                result = self.search(URL)
+                rates = {currency: float(rate) for currency, rate in result["conversion_rates"].items()}
+            except:
+                # Offline or the request failed, keep using the stored rates for a while
+                self.retry_at = self.clock() + retry_interval
+                return False
+
+            fetched_at = int(self.clock())
+            with self.connection:
+                self.connection.execute("DELETE FROM exchange_rates WHERE base=?;", (self.base,))
+                self.connection.executemany("INSERT INTO exchange_rates VALUES (?, ?, ?, ?);",
+                                            [(self.base, currency, rate, fetched_at) for currency, rate in rates.items()])
+            self.rates = rates
+            self.fetched_at = fetched_at
+            return True
+
+    def currencies(self) -> 'list[str]':
+        return sorted(self.rates.keys())
+
+    def rate(self, currency1: str, currency2: str) -> float:
+        # How many of currency2 one of currency1 is worth, raises KeyError for unknown currencies
+        if currency1 == currency2:
+            return 1.0
+        rates = self.rates
+        return rates[currency2] / rates[currency1]
+
+    def convertMany(self, amounts: 'list[float | None]', currencies: 'list[str]', currency: str) -> np.ndarray:
+        # Converts every amount into one currency, amounts that can't be converted become NaN
+        values = np.array(amounts, dtype=float)
+        if len(values) == 0:
+            return values
+
+        # Each currency's rate is only looked up once, however many stocks use it
+        rates = self.rates
+        codes, index = np.unique(np.array(currencies, dtype=str), return_inverse=True)
+        factors = np.array([1.0 if code == currency else
+                            rates[currency] / rates[code] if code in rates and currency in rates else np.nan
+                            for code in codes], dtype=float)
+        return values * factors[index]
+
+
+@timed("fx.totals")
+def portfolioTotals(rate_table: RateTable, stocks: 'list[dict]', currency: str) -> dict:
+    # Total value and profit/loss of every stock in one currency, stocks without a price or rate are counted as missing
+    prices = []
+    quantities = []
+    paid = []
+    currencies = []
+    for stock in stocks:
+        try:
+            prices.append(float(stock["selling_price"]))
+            quantities.append(float(stock["quantity"]))
+            paid.append(float(stock["buying_price"]))
+        except (TypeError, ValueError):
+            prices.append(np.nan)
+            quantities.append(np.nan)
+            paid.append(np.nan)
+        currencies.append(stock["currency"])
+
+    value = np.array(prices) * np.array(quantities)
+    profit_loss = value - np.array(paid)
+
+    value = rate_table.convertMany(value, currencies, currency)
+    profit_loss = rate_table.convertMany(profit_loss, currencies, currency)
+    counted = ~np.isnan(profit_loss)
+
+    return {"currency": currency, "value": round(float(value[counted].sum()), 2),
+            "profit_loss": round(float(profit_loss[counted].sum()), 2), "missing": int(len(stocks) - counted.sum())}
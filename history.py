@@ -0,0 +1,152 @@
+import sqlite3                          # For storing price history
+import threading                        # For loading charts from more than one thread
+import time                             # For working out which bars are missing
+from array import array                 # For passing prices to SQLite without a list of them
+from itertools import repeat            # For the stock code and interval of every row
+from datetime import datetime           # For the start of the year
+from urllib.parse import quote as urlQuote   # For escaping stock codes in URLs
+from metrics import timed                    # For timing chart loads when metrics are on
+from chart_data import decodeChart           # For reading chart responses without parsing all of them
+from database import migrate                 # For creating the history tables
+
+# Bar size used for each chart range
+chart_intervals = {"1d": "1m", "5d": "1d", "1mo": "1d", "3mo": "1d", "6mo": "1d", "ytd": "1d",
+                   "1y": "1d", "2y": "1wk", "5y": "1wk", "max": "1mo"}
+
+# Number of seconds covered by each chart range ("ytd" and "max" are worked out separately)
+range_seconds = {"1d": 86400, "5d": 432000, "1mo": 2678400, "3mo": 7948800, "6mo": 15897600,
+                 "1y": 31622400, "2y": 63244800, "5y": 158112000}
+
+# Number of seconds in each bar
+interval_seconds = {"1m": 60, "1d": 86400, "1wk": 604800, "1mo": 2592000}
+
+# Longest gap one request can fill for each interval (Yahoo only gives 7 days of 1m bars per request)
+max_request_seconds = {"1m": 7 * 86400}
+
+# How long bars are kept for each interval, the rest are kept forever (only the 1 day chart uses 1m bars)
+kept_seconds = {"1m": 7 * 86400}
+
+# Columns stored for every bar
+columns = ["open", "high", "low", "close", "volume"]
+
+
+def rangeStart(duration: str, end: float) -> int:
+    # The earliest timestamp a chart range should show, counting back from end
+    if duration == "max":
+        return 0
+    if duration == "ytd":
+        return int(datetime(datetime.fromtimestamp(end).year, 1, 1).timestamp())
+    return int(end - range_seconds[duration])
+
+
+class HistoryStore():
+    def __init__(self, connection: sqlite3.Connection, search, base_url: str, search_bytes=None) -> None:
+        # search_bytes(URL) -> bytes is used instead of search when given, so only the arrays that are stored get parsed
+        self.connection = connection
+        self.search = search
+        self.search_bytes = search_bytes
+        self.base_url = base_url
+        self.lock = threading.Lock()
+
+        # The tables are created (or upgraded) by the same migrations as the portfolio's
+        migrate(self.connection)
+
+    def coverage(self, stock_code: str, interval: str) -> 'tuple[int, int] | None':
+        # Returns the earliest timestamp stored and when the history was last fetched
+        row = self.connection.execute("SELECT start, fetched_at FROM price_history_coverage WHERE stock_code=? AND interval=?;",
+                                      (stock_code, interval)).fetchone()
+        return None if row is None else (row[0], row[1])
+
+    def lastTimestamp(self, stock_code: str, interval: str) -> 'int | None':
+        row = self.connection.execute("SELECT MAX(timestamp) FROM price_history WHERE stock_code=? AND interval=?;",
+                                      (stock_code, interval)).fetchone()
+        return row[0]
+
+    @timed("history.download")
+    def download(self, stock_code: str, interval: str, duration: str = None, period1: int = None, period2: int = None) -> int:
+        # Download bars from Yahoo and save them, returns the number of bars saved
+        URL = f"{self.base_url}/v8/finance/chart/{urlQuote(stock_code, safe='')}?interval={interval}"
+        if duration is not None:
+            URL += f"&range={duration}"
+        else:
+            URL += f"&period1={period1}&period2={period2}"
+
+        if self.search_bytes is not None:
+            # Rows are made one at a time from the decoded arrays (NaN is saved as NULL)
+            chart = decodeChart(self.search_bytes(URL))
+            timestamps = chart["timestamp"]
+            rows = zip(repeat(stock_code), repeat(interval), timestamps, *[array("d", chart[column].tobytes()) for column in columns])
+            self.connection.executemany("INSERT OR REPLACE INTO price_history VALUES (?, ?, ?, ?, ?, ?, ?, ?);", rows)
+            return len(timestamps)
+
+        result = self.search(URL)["chart"]["result"][0]
+        timestamps = result.get("timestamp") or []
+        quote = result["indicators"]["quote"][0]
+
+        rows = [(stock_code, interval, timestamps[i], *[(quote.get(column) or [None] * len(timestamps))[i] for column in columns])
+                for i in range(len(timestamps))]
+        self.connection.executemany("INSERT OR REPLACE INTO price_history VALUES (?, ?, ?, ?, ?, ?, ?, ?);", rows)
+        return len(rows)
+
+    def update(self, stock_code: str, duration: str, now: float = None) -> None:
+        # Only download what isn't stored yet
+        interval = chart_intervals[duration]
+        now = int(time.time() if now is None else now)
+        start = rangeStart(duration, now)
+        coverage = self.coverage(stock_code, interval)
+
+        if coverage is not None and coverage[0] <= start:
+            # Everything older is stored, so only ask for bars since the last one (which may have changed)
+            if now - coverage[1] < min(interval_seconds[interval], 60):
+                return
+            last = self.lastTimestamp(stock_code, interval) or start
+            if last >= start and now - last <= max_request_seconds.get(interval, now):
+                self.download(stock_code, interval, period1=last, period2=now)
+                start = coverage[0]
+            else:
+                # Too long since the last update for one request, so the range is downloaded again
+                # The stored bars before it aren't counted as covered any more, there's a gap after them
+                self.download(stock_code, interval, duration=duration)
+        else:
+            # This range goes back further than anything stored, so download all of it once
+            self.download(stock_code, interval, duration=duration)
+            if coverage is not None:
+                start = min(start, coverage[0])
+
+        if interval in kept_seconds:
+            self.connection.execute("DELETE FROM price_history WHERE stock_code=? AND interval=? AND timestamp<?;",
+                                    (stock_code, interval, now - kept_seconds[interval]))
+            start = max(start, now - kept_seconds[interval])
+
+        self.connection.execute("INSERT OR REPLACE INTO price_history_coverage VALUES (?, ?, ?, ?);",
+                                (stock_code, interval, start, now))
+        self.connection.commit()
+
+    @timed("history.load_chart")
+    def loadChart(self, stock_code: str, duration: str) -> 'dict[str, list]':
+        with self.lock:
+            return self.readChart(stock_code, duration)
+
+    def readChart(self, stock_code: str, duration: str) -> 'dict[str, list]':
+        # Returns every column for the range, fetching new bars first if possible
+        interval = chart_intervals[duration]
+        try:
+            self.update(stock_code, duration)
+        except:
+            # Offline or the request failed, show whatever is stored
+            self.connection.rollback()
+
+        # Count back from the newest bar so charts still show the last session when the market is closed
+        last = self.lastTimestamp(stock_code, interval)
+        if last is None:
+            return {"timestamp": [], **{column: [] for column in columns}}
+        start = rangeStart(duration, last)
+
+        rows = self.connection.execute(f"SELECT timestamp, {', '.join(columns)} FROM price_history "
+                                       "WHERE stock_code=? AND interval=? AND timestamp>=? ORDER BY timestamp;",
+                                       (stock_code, interval, start)).fetchall()
+
+        chart = {"timestamp": [row[0] for row in rows]}
+        for i, column in enumerate(columns):
+            chart[column] = [row[i+1] for row in rows]
+        return chart
@@ -0,0 +1,121 @@
+import threading                        # For sharing the client between threads
+import time                             # For measuring request latency
+from collections import deque           # For keeping recent latencies
+from metrics import timed, timer        # For timing requests when metrics are on
+
+# Default settings for the shared client
+connect_timeout = 5     # Seconds to wait for a connection
+read_timeout = 15       # Seconds to wait for a response
+retries = 3             # Number of times to retry a failed request
+backoff_factor = 0.5    # Seconds to wait before retrying, doubled each time
+pool_size = 10          # Number of connections to keep open per host
+
+
+class HttpClient():
+    def __init__(self, connect_timeout: float = connect_timeout, read_timeout: float = read_timeout,
+                 retries: int = retries, backoff_factor: float = backoff_factor, pool_size: int = pool_size) -> None:
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+
+        self.session = None
+        self.lock = threading.Lock()
+
+        self.request_count = 0
+        self.error_count = 0
+        self.latencies = deque(maxlen=1000)
+
+    def openSession(self):
+        # requests is only imported once the first request is made
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(total=self.retries, backoff_factor=self.backoff_factor,
+                      status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+
+        session = requests.Session()
+        session.headers["User-Agent"] = "Mozilla/5.0 (Stock Tracker)"
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @timed("http.get")
+    def get(self, URL: str):
+        with self.lock:
+            if self.session is None:
+                self.session = self.openSession()
+            session = self.session
+
+        start = time.perf_counter()
+        try:
+            response = session.get(URL, timeout=self.timeout)
+            response.raise_for_status()
+        except:
+            with self.lock:
+                self.error_count += 1
+            raise
+        finally:
+            with self.lock:
+                self.request_count += 1
+                self.latencies.append(time.perf_counter() - start)
+
+        return response
+
+    def getBytes(self, URL: str) -> bytes:
+        # The undecoded body, for responses that are parsed without json
+        return self.get(URL).content
+
+    def getJSON(self, URL: str) -> dict:
+        response = self.get(URL)
+        with timer("http.decode"):
+            return response.json()
+
+    @timed("http.post")
+    def postJSON(self, URL: str, data) -> int:
+        # Sends data as a JSON body (not retried), returns the status code
+        with self.lock:
+            if self.session is None:
+                self.session = self.openSession()
+            session = self.session
+
+        response = session.post(URL, json=data, timeout=self.timeout)
+        response.raise_for_status()
+        return response.status_code
+
+    def stats(self) -> dict:
+        # Connections are only opened when none are free, so every other request reused one
+        connections_opened = 0
+        pool_requests = 0
+        with self.lock:
+            if self.session is not None:
+                # The same adapter is mounted for http:// and https://, so only count it once
+                adapters = {id(adapter): adapter for adapter in self.session.adapters.values()}
+                for adapter in adapters.values():
+                    for key in adapter.poolmanager.pools.keys():
+                        pool = adapter.poolmanager.pools[key]
+                        connections_opened += pool.num_connections
+                        pool_requests += pool.num_requests
+
+            latencies = sorted(self.latencies)
+
+        return {
+            "requests": self.request_count,
+            "errors": self.error_count,
+            "connections_opened": connections_opened,
+            "connections_reused": max(pool_requests - connections_opened, 0),
+            "latency_avg": sum(latencies) / len(latencies) if latencies else 0,
+            "latency_max": latencies[-1] if latencies else 0,
+        }
+
+    def close(self) -> None:
+        with self.lock:
+            if self.session is not None:
+                self.session.close()
+                self.session = None
+
+
+# Shared client used by search()
+client = HttpClient()
@@ -1,29 +1,61 @@
-# If debug is enabled, the program will not search for stock information online
-offline_mode = False
+# "record" saves every web response in replay_folder, "replay" serves them back without going online (None uses the internet)
+replay_mode = None
+replay_folder = "fixtures"
+
+# Seconds added to every replayed response, and how often (0 to 1) a replayed request fails
+replay_latency = 0
+replay_error_rate = 0
+
+import os                               # For settings given by environment variables
+
+# Yahoo Finance host (change to the address printed by mock_server.py to run without internet, or set STOCK_TRACKER_YAHOO_URL)
+yahoo_url = os.environ.get("STOCK_TRACKER_YAHOO_URL", "https://query2.finance.yahoo.com")
+
+# Exchange rate host (mock_server.py serves this too, or set STOCK_TRACKER_EXCHANGE_RATE_URL)
+exchange_rate_url = os.environ.get("STOCK_TRACKER_EXCHANGE_RATE_URL", "https://v6.exchangerate-api.com")
+
+# Currency the portfolio's total value and profit/loss are shown in when the app starts
+reporting_currency = "USD"
+
+# Triggered alerts are always shown in the window, and also appended to this file / posted to this URL when set
+alert_log_file = None
+alert_webhook_url = None
+
+# Startup is profiled first (when STOCK_TRACKER_PROFILE is set) so the imports below are included
+from metrics import timed, startProfile, watchStalls, startLogging, printSummary   # For finding out where time goes
+startup_profiler = startProfile()
 
-from datetime import datetime           # For getting the current date and time
-import sqlite3                          # For database management
-from requests_html import HTMLSession   # https://github.com/psf/requests-html  # For web scraping
 from tkinter import *                   # For GUI
 from tkinter.ttk import *               # For GUI
 from matplotlib.figure import Figure    # For plotting stock charts
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg # For plotting stock charts
+from matplotlib.dates import date2num   # For finding chart points under the mouse
+import numpy as np                      # For working with chart data
+from engine import PortfolioEngine, readApiKey    # For everything that doesn't need the window
+from http_client import client          # For making web requests over shared connections
+from replay import ReplayTransport      # For running from recorded responses
+from workers import BackgroundWorker    # For fetching data without freezing the GUI
+from portfolio_grid import PortfolioGrid    # For showing the portfolio table
+from scheduler import RefreshScheduler  # For deciding when to refresh each stock
+from chart_data import prepareChart, emptyChart, valueRange, downsampleIndices, visibleSlice, nearestIndex    # For preparing chart data
+from alerts import LogSink, WebhookSink, alert_metrics, alert_directions, describeAlert   # For alert rules and where triggered alerts go
+from analytics import moving_average_windows, movingAverages, rangeSummary, periods_per_year, analytics_interval   # For chart overlays and statistics
+from history import chart_intervals     # For the bar size of each chart range
 
 # API keys (stored in secrets.txt)
-try:
-    with open("secrets.txt", "r") as file:
-        exchange_rate_api_key = file.readline()
-except:
-    exchange_rate_api_key = "Error"
+exchange_rate_api_key = readApiKey()
 
 
 class StockInfoWindow():
     def __init__(self, master, stock_code: str) -> None:
         self.stock_code = stock_code
 
+        # Shown until the real name has been fetched
+        self.stock_name = stock_code
+
         self.master = Toplevel(master)
         self.master.configure()
-        self.master.title(f"{fetchStockName(stock_code)} Stock Information")
+        self.master.title(f"{self.stock_name} Stock Information")
 
         self.font_family = "Arial"
         self.body_font_size = 12
@@ -36,7 +68,8 @@ class StockInfoWindow():
 
     def pageItems(self) -> None:
         title_frame = Frame(master=self.master, padding=15)
-        txt_title = Label(text=f"{fetchStockName(self.stock_code)} ({self.stock_code}) Stock Information", master=title_frame, font=(self.font_family, self.title_font_size))
+        self.title_var = StringVar(value=f"{self.stock_name} ({self.stock_code}) Stock Information")
+        txt_title = Label(textvariable=self.title_var, master=title_frame, font=(self.font_family, self.title_font_size))
         txt_title.pack()
 
         stock_info_frame = Frame(master=self.master, padding=5)
@@ -57,8 +90,7 @@ class StockInfoWindow():
                              ["5y", "5 Years"],
                              ["max", "Max"]]
 
-        self.selected_chart_range = StringVar()
-        self.selected_chart_range.set(chart_range_types[0])
+        self.selected_chart_range = chart_range_types[0]
 
         for i in range(len(chart_range_types)):
             Button(text=chart_range_types[i][1], master=chart_options_frame, command=lambda range_option=chart_range_types[i]: self.changeChartRange(range_option)).grid(row=i+1, column=0)
@@ -81,6 +113,16 @@ class StockInfoWindow():
         for i in range(len(self.chart_data_types)):
             Checkbutton(text=self.chart_data_types[i][1], master=chart_options_frame, variable=self.chart_data_visibility[i], command=lambda: self.toggleChartPriceTypes()).grid(row=i+len(chart_range_types)+3, column=0)
 
+        # Moving averages of the closing price
+        overlay_row = len(chart_range_types) + len(self.chart_data_types) + 3
+        Label(text="", master=chart_options_frame).grid(row=overlay_row, column=0)
+        chart_overlay_label = Label(text="Overlays:", master=chart_options_frame, font=(self.font_family, self.body_font_size))
+        chart_overlay_label.grid(row=overlay_row+1, column=0)
+
+        self.overlay_visibility = [StringVar(value=False) for window in moving_average_windows]
+        for i in range(len(moving_average_windows)):
+            Checkbutton(text=f"{moving_average_windows[i]} Bar Average", master=chart_options_frame, variable=self.overlay_visibility[i], command=lambda: self.toggleChartPriceTypes()).grid(row=i+overlay_row+2, column=0)
+
         chart_options_frame.grid(row=0, column=0)
 
         # Stock chart
@@ -88,8 +130,40 @@ class StockInfoWindow():
         self.plot1 = self.fig.subplots(1, 1)
         self.plot1.set_autoscaley_on(False)
         self.chart_canvas = FigureCanvasTkAgg(self.fig, master=stock_info_frame)
+        self.chart_canvas.draw = timed("chart.render")(self.chart_canvas.draw)
 
-        self.toggleChartPriceTypes()
+        # Empty until the first range has loaded
+        self.chart_data = emptyChart()
+        self.chart_x = self.chart_data["time"].astype(float)
+        self.redrawing = False
+
+        # Every series has one line and one shaded area, which are updated, shown and hidden instead of being redrawn
+        self.lines = []
+        self.fills = []
+        for column, label in self.chart_data_types:
+            line, = self.plot1.plot([], [], "-", color=self.changeGraphColor(column), label=label)
+            self.lines.append((line, column))
+            self.fills.append(self.plot1.fill_between([], [], color=self.changeGraphColor(column), alpha=0.1))
+
+        # Overlays are worked out once per range and share the points picked for the price lines
+        self.overlays = []
+        self.overlay_data = {}
+        for window, color in zip(moving_average_windows, ["tab:blue", "tab:orange", "tab:purple", "tab:brown"]):
+            line, = self.plot1.plot([], [], "--", color=color, linewidth=1, label=f"{window} Bar Average")
+            self.overlays.append((line, window))
+
+        self.plot1.xaxis_date()
+        self.showMainChartInfo()
+
+        # Only as many points are drawn as the chart is wide, so pick them again when that changes
+        self.fig.canvas.mpl_connect("resize_event", lambda event: self.decimateChart())
+        self.plot1.callbacks.connect("xlim_changed", lambda axes: self.decimateChart())
+
+        # The chart without the hover annotation is saved after every full draw, so hovering only redraws the annotation
+        self.background = None
+        self.hovered_point = None
+        self.fig.canvas.mpl_connect("draw_event", self.saveChartBackground)
+        self.changeChartRange(self.selected_chart_range)
 
         # https://stackoverflow.com/a/47166787
         self.fig.canvas.mpl_connect("motion_notify_event", self.hover)
@@ -97,161 +171,242 @@ class StockInfoWindow():
         self.chart_canvas.get_tk_widget().grid(row=0, column=1)
 
         # Show the current, opening, closing, high, and low prices
-        self.fetchStockData()
-
-        # Get live stock data
-        self.master.after(2000, self.fetchLiveStockData)
         self.current_stock_price_var = StringVar(value="Current Price: Loading...")
+        self.opening_stock_price_var = StringVar(value="Opening Price: Loading...")
+        self.closing_stock_price_var = StringVar(value="Previous Closing Price: Loading...")
+        self.high_stock_price_var = StringVar(value="High Price: Loading...")
 
         current_stock_price = Label(textvariable=self.current_stock_price_var, justify="left", master=stock_info_frame, font=(self.font_family, self.body_font_size))
         current_stock_price.grid(row=1, column=1, sticky="W")
 
-        opening_stock_price = Label(text=f"Opening Price: {self.fetchStockData()[1]}", justify="left", master=stock_info_frame, font=(self.font_family, self.body_font_size))
+        opening_stock_price = Label(textvariable=self.opening_stock_price_var, justify="left", master=stock_info_frame, font=(self.font_family, self.body_font_size))
         opening_stock_price.grid(row=2, column=1, sticky="W")
 
-        closing_stock_price = Label(text=f"Previous Closing Price: {self.fetchStockData()[2]}", justify="left", master=stock_info_frame, font=(self.font_family, self.body_font_size))
+        closing_stock_price = Label(textvariable=self.closing_stock_price_var, justify="left", master=stock_info_frame, font=(self.font_family, self.body_font_size))
         closing_stock_price.grid(row=3, column=1, sticky="W")
 
-        high_stock_price = Label(text=f"High Price: {self.fetchStockData()[3]}", justify="left", master=stock_info_frame, font=(self.font_family, self.body_font_size))
+        high_stock_price = Label(textvariable=self.high_stock_price_var, justify="left", master=stock_info_frame, font=(self.font_family, self.body_font_size))
         high_stock_price.grid(row=4, column=1, sticky="W")
 
+        # Return, volatility and max drawdown over the range shown
+        self.range_stats_var = StringVar(value="Range Statistics: Loading...")
+        range_stats = Label(textvariable=self.range_stats_var, justify="left", master=stock_info_frame, font=(self.font_family, self.body_font_size))
+        range_stats.grid(row=5, column=1, sticky="W")
+
+        # Alert rules for this stock
+        alerts_frame = Frame(master=stock_info_frame, padding=5)
+        self.alert_metric_var = StringVar(value=list(alert_metrics.values())[0])
+        self.alert_direction_var = StringVar(value=list(alert_directions.values())[0])
+        Label(text="Alert when", master=alerts_frame, font=(self.font_family, self.body_font_size)).grid(row=0, column=0)
+        Combobox(master=alerts_frame, textvariable=self.alert_metric_var, values=list(alert_metrics.values()), state="readonly", width=18).grid(row=0, column=1, padx=5)
+        Combobox(master=alerts_frame, textvariable=self.alert_direction_var, values=list(alert_directions.values()), state="readonly", width=12).grid(row=0, column=2, padx=5)
+        self.alert_threshold_field = Entry(master=alerts_frame, width=10)
+        self.alert_threshold_field.grid(row=0, column=3, padx=5)
+        Button(text="Add Alert", master=alerts_frame, command=lambda: self.addAlert()).grid(row=0, column=4, padx=5)
+
+        self.alert_rules = []
+        self.alert_list = Listbox(master=alerts_frame, height=4, width=60, font=(self.font_family, self.body_font_size))
+        self.alert_list.grid(row=1, column=0, columnspan=4, pady=5, sticky="W")
+        Button(text="Remove Alert", master=alerts_frame, command=lambda: self.removeAlert()).grid(row=1, column=4, padx=5)
+        alerts_frame.grid(row=6, column=1, sticky="W")
+        self.showAlertRules()
+
+        # Get the stock's name in the background, prices come from the scheduler (more often while this window is open)
+        worker.submit(engine.fetchStockName, self.stock_code, callback=self.showStockName)
+        scheduler.watch(self.stock_code, self.showQuote)
+        self.master.bind("<Destroy>", self.closeWindow)
+
         # Add the frames to the screen
         title_frame.grid(row=0, column=0)
         stock_info_frame.grid(row=1, column=0)
 
-    def fetchStockData(self) -> list:
-        URL = f"https://query2.finance.yahoo.com/v6/finance/options/{self.stock_code}"
+    def closeWindow(self, event) -> None:
+        # <Destroy> is also sent for every widget inside the window
+        if event.widget == self.master:
+            scheduler.unwatch(self.stock_code, self.showQuote)
 
+    def addAlert(self) -> None:
         try:
-            result = search(URL)
-            info = result["optionChain"]["result"][0]["quote"]
+            threshold = float(self.alert_threshold_field.get())
+        except ValueError:
+            return
+
+        # The labels shown in the comboboxes back to the names the rules use
+        metric = [name for name, label in alert_metrics.items() if label == self.alert_metric_var.get()][0]
+        direction = [name for name, label in alert_directions.items() if label == self.alert_direction_var.get()][0]
+        worker.submitDatabase(engine.alerts.addRule, self.stock_code, metric, direction, threshold, callback=lambda rule: self.showAlertRules())
+        self.alert_threshold_field.delete(0, "end")
+
+    def removeAlert(self) -> None:
+        selection = self.alert_list.curselection()
+        if len(selection):
+            worker.submitDatabase(engine.alerts.removeRule, self.alert_rules[selection[0]]["alert_id"], callback=lambda removed: self.showAlertRules())
+
+    def showAlertRules(self) -> None:
+        self.alert_rules = engine.alerts.stockRules(self.stock_code)
+        self.alert_list.delete(0, "end")
+        for rule in self.alert_rules:
+            self.alert_list.insert("end", describeAlert(rule))
+
+    def fetchStockData(self, info: 'dict | None') -> list:
+        try:
+            # Returns, current price, opening price, closing price, high price, low price
+            return [info["regularMarketPrice"], info["regularMarketOpen"], info["regularMarketPreviousClose"], info["regularMarketDayHigh"], info["regularMarketDayLow"]]
         except:
             return ["Error" for i in range(5)]
 
-        # Returns, current price, opening price, closing price, high price, low price
-        return [info["regularMarketPrice"], info["regularMarketOpen"], info["regularMarketPreviousClose"], info["regularMarketDayHigh"], info["regularMarketDayLow"]]
-
-    def fetchLiveStockData(self) -> None:
-        URL = f"https://query2.finance.yahoo.com/v6/finance/options/{self.stock_code}"
+    def showStockName(self, name: str) -> None:
+        if name != "Error":
+            self.stock_name = name
 
-        try:
-            result = search(URL)
-            info = str(result["optionChain"]["result"][0]["quote"]["regularMarketPrice"])
+        self.master.title(f"{self.stock_name} Stock Information")
+        self.title_var.set(f"{self.stock_name} ({self.stock_code}) Stock Information")
+        self.plot1.set_title(f"{self.stock_name} ({self.stock_code}) Stock Chart ({self.selected_chart_range[1]})")
+        self.chart_canvas.draw_idle()
 
-            self.current_stock_price_var.set(f"Current Price: {info}")
+    def showStockData(self, data: list) -> None:
+        self.opening_stock_price_var.set(f"Opening Price: {data[1]}")
+        self.closing_stock_price_var.set(f"Previous Closing Price: {data[2]}")
+        self.high_stock_price_var.set(f"High Price: {data[3]}")
 
-            # Rerun the function every minute
-            self.master.after(60000, self.fetchLiveStockData)
-        except:
-            info = "Error! Please try again later."
+        self.showLiveStockData(data)
 
-            self.current_stock_price_var.set(f"Current Price: {info}")
+    def showQuote(self, quote: 'dict | None') -> None:
+        # Called by the scheduler after every refresh of this stock (quote is None if it failed)
+        self.showStockData(self.fetchStockData(quote))
 
-            # Rerun the function every 2 minutes in case of an error
-            self.master.after(120000, self.fetchLiveStockData)
-
-    def fetchStockChartData(self, duration: str, metric_type: str) -> list:
-        if duration == "1d":
-            interval = "1m"
-        elif duration == "5d" or duration == "1mo" or duration == "3mo" or duration == "6mo" or duration == "1y" or duration == "ytd":
-            interval = "1d"
-        elif duration == "2y" or duration == "5y":
-            interval = "1wk"
-        elif duration == "max":
-            interval = "1mo"
+    def showLiveStockData(self, data: list) -> None:
+        if data[0] != "Error":
+            self.current_stock_price_var.set(f"Current Price: {data[0]}")
         else:
-            interval = ""
+            info = "Error! Please try again later."
 
-        URL = f"https://query2.finance.yahoo.com/v8/finance/chart/{self.stock_code}?metrics={metric_type}?&range={duration}&interval={interval}"
-        result = search(URL)
+            self.current_stock_price_var.set(f"Current Price: {info}")
 
+    def fetchStockChartData(self, duration: str) -> dict:
+        # Every column comes from one load, so switching between them doesn't fetch anything
         try:
-            time = [datetime.fromtimestamp(x) for x in result["chart"]["result"][0]["timestamp"]]
-            prices = result["chart"]["result"][0]["indicators"]["quote"][0][metric_type]
+            chart = prepareChart(history_store.loadChart(self.stock_code, duration))
         except:
-            time, prices = [], []
+            chart = emptyChart()
 
-        return time, prices
+        return chart
 
-    def changeChartRange(self, chart_range: str) -> None:
-        self.plot1.clear()
-        self.lines = []
+    def changeChartRange(self, chart_range: list) -> None:
+        self.selected_chart_range = chart_range
 
-        for i in self.chart_data_visibility:
-            if bool(int(i.get())):
-                chart_data = self.chart_data_types[self.chart_data_visibility.index(i)]
-                time, data = self.fetchStockChartData(chart_range[0], chart_data[0])
-                self.line = self.plot1.plot(time, data, "-", color=self.changeGraphColor(chart_data[0]), label=chart_data[1])
+        # Load in the background, the chart is redrawn once the data arrives
+        worker.submit(self.fetchStockChartData, chart_range[0], callback=lambda chart, chart_range=chart_range: self.showChartData(chart_range, chart))
 
-                # Fill in missing data
-                for i, val in enumerate(data):
-                    if val == None:
-                        data[i] = data[i-1]
-                    elif i == 0 and val == None:
-                        data[i] = 0
+    def showChartData(self, chart_range: list, chart: dict) -> None:
+        # A different range was picked while this one was loading
+        if chart_range != self.selected_chart_range:
+            return
 
-                xmin, xmax, ymin, ymax = self.plot1.axis()
-                if min(data) < ymin:
-                    ymin = min(data)
-                if max(data) > ymax:
-                    ymax = max(data)
+        self.chart_data = chart
+        self.chart_x = date2num(chart["time"]) if len(chart["time"]) else chart["time"].astype(float)
+        self.overlay_data = movingAverages(chart["close"])
+        self.showRangeStats(rangeSummary(chart["close"], periods_per_year[chart_intervals[chart_range[0]]]))
 
-                self.plot1.axes.set_ylim([ymin, ymax])
+        # Changing the x limits picks the points to draw again
+        self.redrawing = True
+        if len(self.chart_x):
+            self.plot1.set_xlim(self.chart_x[0], self.chart_x[-1])
+        self.redrawing = False
 
-                self.plot1.fill_between(time, data, color=self.changeGraphColor(chart_data[0]), alpha=0.1)
-
-        self.plot1.set_title(f"{fetchStockName(self.stock_code)} ({self.stock_code}) Stock Chart ({chart_range[1]})")
-        self.showMainChartInfo()
+        self.drawChart()
 
-        self.selected_chart_range.set(chart_range)
+    def showRangeStats(self, stats: dict) -> None:
+        if np.isnan(stats["return"]):
+            self.range_stats_var.set("Range Statistics: Not enough data")
+            return
 
-        self.chart_canvas.draw()
+        self.range_stats_var.set(f"Range Return: {stats['return']:+.2%}    Volatility: {stats['volatility']:.2%}    "
+                                 f"Max Drawdown: {stats['max_drawdown']:.2%}")
 
     def toggleChartPriceTypes(self) -> None:
-        # Change the chart data to the selected data
-        self.plot1.clear()
-        self.lines = []
-
-        for i in self.chart_data_visibility:
-            if bool(int(i.get())):
-                chart_data = self.chart_data_types[self.chart_data_visibility.index(i)]
-                time, data = self.fetchStockChartData(str(self.selected_chart_range.get().split(", ")[0][2:-1]), chart_data[0])
-                self.line = self.plot1.plot(time, data, "-", color=self.changeGraphColor(chart_data[0]), label=chart_data[1])
-
-                # Fill in missing data
-                for i, val in enumerate(data):
-                    if val == None:
-                        data[i] = data[i-1]
-                    elif i == 0 and val == None:
-                        data[i] = 0
-
-                xmin, xmax, ymin, ymax = self.plot1.axis()
-                if min(data) < ymin:
-                    ymin = min(data)
-                if max(data) > ymax:
-                    ymax = max(data)
-
-                self.plot1.axes.set_ylim([ymin, ymax])
-
-                self.plot1.fill_between(time, data, color=self.changeGraphColor(chart_data[0]), alpha=0.1)
-
-        self.plot1.set_title(f"{fetchStockName(self.stock_code)} ({self.stock_code}) Stock Chart ({str(self.selected_chart_range.get().split(', ')[1][1:-2])})")
-        self.showMainChartInfo()
-
-        self.chart_canvas.draw()
+        # Change the chart data to the selected data (already loaded for this range)
+        self.drawChart()
+
+    def visibleLines(self) -> 'list[int]':
+        # Indexes of the series that are ticked
+        return [i for i in range(len(self.chart_data_visibility)) if bool(int(self.chart_data_visibility[i].get()))]
+
+    def visibleOverlays(self) -> 'list[int]':
+        return [i for i in range(len(self.overlay_visibility)) if bool(int(self.overlay_visibility[i].get()))]
+
+    @timed("chart.draw")
+    def drawChart(self) -> None:
+        visible = self.visibleLines() if len(self.chart_x) else []
+        overlays = self.visibleOverlays() if len(self.chart_x) else []
+
+        for i in range(len(self.lines)):
+            self.lines[i][0].set_visible(i in visible)
+            self.fills[i].set_visible(i in visible)
+        for i in range(len(self.overlays)):
+            self.overlays[i][0].set_visible(i in overlays)
+
+        # Only list the series that are shown
+        if len(visible) or len(overlays):
+            self.plot1.legend(handles=[self.lines[i][0] for i in visible] + [self.overlays[i][0] for i in overlays])
+        elif self.plot1.get_legend() is not None:
+            self.plot1.get_legend().remove()
+
+        # Fit every shown series in one go (starting from 0 to 1, like an empty chart)
+        value_range = valueRange([self.chart_data["filled"][self.lines[i][1]] for i in visible] +
+                                 [self.overlay_data[self.overlays[i][1]] for i in overlays])
+        if value_range is not None:
+            self.plot1.set_ylim([min(0, value_range[0]), max(1, value_range[1])])
+
+        self.plot1.set_title(f"{self.stock_name} ({self.stock_code}) Stock Chart ({self.selected_chart_range[1]})")
+
+        self.hideAnnotation()
+        self.decimateChart()
+
+    @timed("chart.decimate")
+    def decimateChart(self) -> None:
+        # Draw at most a few points per pixel of the part of the chart that can be seen
+        visible = self.visibleLines() if len(self.chart_x) else []
+        overlays = self.visibleOverlays() if len(self.chart_x) else []
+        if self.redrawing or len(visible) + len(overlays) == 0:
+            self.chart_canvas.draw_idle()
+            return
+
+        xmin, xmax = self.plot1.get_xlim()
+        start, stop = visibleSlice(self.chart_x, xmin, xmax)
+        buckets = max(int(self.plot1.bbox.width), 1)
+
+        # Use the same points for every series so the lines and shading line up (overlays alone use the closing price's)
+        columns = [self.lines[i][1] for i in visible] if len(visible) else ["close"]
+        indices = np.unique(np.concatenate([downsampleIndices(self.chart_data["filled"][column][start:stop], buckets)
+                                            for column in columns])) + start
+        x = self.chart_x[indices]
+
+        for i in overlays:
+            line, window = self.overlays[i]
+            line.set_data(x, self.overlay_data[window][indices])
+
+        for i in visible:
+            line, column = self.lines[i]
+            filled = self.chart_data["filled"][column][indices]
+
+            # Gaps are left in the line, but filled in (already done when loading) for the shading
+            line.set_data(x, self.chart_data[column][indices])
+            self.fills[i].set_verts([np.column_stack([np.concatenate([[x[0]], x, [x[-1]]]),
+                                                      np.concatenate([[0], filled, [0]])])])
+
+        # Multiple changes before the next idle moment only cause one redraw
+        self.chart_canvas.draw_idle()
 
     def showMainChartInfo(self) -> None:
         self.plot1.set_ylabel("Price")
         self.plot1.set_xlabel("Time")
         self.plot1.grid(True, which="both", linestyle="--", linewidth=0.5)
 
-        for i in self.chart_data_visibility:
-            if bool(int(i.get())):
-                self.plot1.legend()
-
+        # Animated artists are left out of full draws and drawn on top by blitAnnotation()
         self.annot = self.plot1.axes.annotate("", xy=(0,0), xytext=(-20,20),textcoords="offset points",
                     bbox=dict(boxstyle="round", fc="w"),
-                    arrowprops=dict(arrowstyle="->"))
+                    arrowprops=dict(arrowstyle="->"), animated=True)
         self.annot.set_visible(False)
 
     def changeGraphColor(self, data: str) -> str:
@@ -267,137 +422,115 @@ class StockInfoWindow():
             return "black"
 
     # https://stackoverflow.com/a/47166787
-    def updateAnnotation(self, ind):
-        x,y = self.line[0].get_data()
-        self.annot.xy = (x[ind["ind"][0]], y[ind["ind"][0]])
-        text = f"{str(x[ind['ind'][0]])}: {str(round(float(y[ind['ind'][0]]), 2))}"
+    def updateAnnotation(self, i: int, column: str) -> None:
+        # Uses the original data, not the points that were drawn
+        time, price = self.chart_data["time"][i], self.chart_data[column][i]
+        self.annot.xy = (self.chart_x[i], price)
+        text = f"{str(time).replace('T', ' ')}: {str(round(float(price), 2))}"
         self.annot.set_text(text)
         self.annot.get_bbox_patch().set_alpha(0.75)
 
+    def hoveredPoint(self, event) -> 'int | None':
+        # The closest original point to the mouse on the last series shown, if it is within a few pixels
+        line, column = self.lines[self.visibleLines()[-1]]
+        i = nearestIndex(self.chart_x, event.xdata)
+        if i is None or np.isnan(self.chart_data[column][i]):
+            return None
+
+        x, y = self.plot1.transData.transform((self.chart_x[i], self.chart_data[column][i]))
+        if abs(y - event.y) > line.get_pickradius():
+            return None
+        return i
+
+    def saveChartBackground(self, event) -> None:
+        self.background = self.chart_canvas.copy_from_bbox(self.fig.bbox)
+        self.plot1.draw_artist(self.annot)
+
+    @timed("chart.hover")
+    def blitAnnotation(self) -> None:
+        # Put the saved chart back and draw only the annotation over it
+        if self.background is None:
+            self.chart_canvas.draw_idle()
+            return
+
+        self.chart_canvas.restore_region(self.background)
+        self.plot1.draw_artist(self.annot)
+        self.chart_canvas.blit(self.fig.bbox)
+
+    def hideAnnotation(self) -> None:
+        self.hovered_point = None
+        self.annot.set_visible(False)
+
     def hover(self, event):
-        vis = self.annot.get_visible()
-        if event.inaxes == self.plot1:
-            cont, ind = self.line[0].contains(event)
-            if cont:
-                self.updateAnnotation(ind)
-                self.annot.set_visible(True)
-                self.fig.canvas.draw_idle()
-            else:
-                if vis:
-                    self.annot.set_visible(False)
-                    self.fig.canvas.draw_idle()
-
-class StockNotFoundError(Exception):
-    pass
-
-
-def openDatabase(filename: str) -> sqlite3.Connection:
-    connection = sqlite3.connect(filename)
-    connection.row_factory = sqlite3.Row
-    return connection
-
-def readDatabase(connection: sqlite3.Connection, sql: str) -> 'list[dict]':
-    cursor = connection.cursor()
-    cursor.execute(sql)
-    result = [ dict(row) for row in cursor.fetchall() ]
-    return result
-
-def writeDatabase(connection: sqlite3.Connection, sql: str) -> int:
-    cursor = connection.cursor()
-    rows_affected = cursor.execute(sql).rowcount
-    connection.commit()
-    return rows_affected
-
-def closeDatabase(connection: sqlite3.Connection) -> None:
-    connection.close()
-
-def search(URL: str) -> dict:
-    # If debug is enabled, don't search (as if it's offline)
-    if offline_mode:
-        return ""
-
-    # Search the given link and return the data in a dictionary
-    session = HTMLSession()
-    result = session.get(URL)
-    result = result.json()
-    return result
-
-def fetchStockName(stock_code: str) -> str:
-    URL = f"https://query2.finance.yahoo.com/v6/finance/options/{stock_code}"
-    result = search(URL)
-
-    # Get the stock's name
-    try:
-        name = result["optionChain"]["result"][0]["quote"]["shortName"]
-    except:
-        name = "Error"
-
-    return name
-
-def fetchStockCurrency(stock_code: str) -> str:
-    URL = f"https://query2.finance.yahoo.com/v6/finance/options/{stock_code}"
-    result = search(URL)
-
-    # Get the stock's trading currency
-    try:
-        currency = result["optionChain"]["result"][0]["quote"]["currency"]
-    except:
-        currency = "Error"
-
-    return currency
-
-def fetchExchangeRate(currency1: str, currency2: str) -> 'float | str':
-    URL = f"https://v6.exchangerate-api.com/v6/{exchange_rate_api_key}/latest/{currency1}"
-    result = search(URL)
-
-    # Get the exchange rate between two currencies
-    try:
-        rate = float(result["conversion_rates"][currency2])
-    except:
-        rate = "Error"
-
-    return rate
+        if len(self.chart_x) == 0 or len(self.visibleLines()) == 0:
+            return
+
+        i = self.hoveredPoint(event) if event.inaxes == self.plot1 else None
+
+        # Nothing to redraw if the mouse is still over the same point (or still over nothing)
+        if i == self.hovered_point:
+            return
+
+        if i is not None:
+            self.updateAnnotation(i, self.lines[self.visibleLines()[-1]][1])
+            self.annot.set_visible(True)
+        else:
+            self.annot.set_visible(False)
+
+        self.hovered_point = i
+        self.blitAnnotation()
 
 def addStockToPortfolio() -> None:
-    code = input_code_field.get()
+    # Codes are saved the way Yahoo sends them back
+    code = input_code_field.get().strip().upper()
     price = float(input_price_field.get())
     quantity = int(input_quantity_field.get())
-    true_currency = fetchStockCurrency(code)
     currency = currency_field.get()
 
     if "" in [code, currency] or price <= 0 or quantity <= 0:
         return
 
-    if true_currency != "Error":
-        exchange_rate = fetchExchangeRate(currency, true_currency)
-        if exchange_rate != "Error":
-            price *= exchange_rate
-            currency = true_currency
-
-    # Add to the database
-    writeDatabase(connection, f"INSERT INTO stocks (stock_code, stock_name, quantity, buying_price, currency) VALUES ('{code}', '{fetchStockName(code)}', {quantity}, {price}, '{currency}');")
-    add_successful_text = Label(text=f"{quantity} {code} stocks added successfully! Please restart the application to update your portfolio.", master=add_frame, font=(font_family, body_font_size))
-    add_successful_text.grid(row=2, columnspan=4)
-
-def removeStockFromPortfolio(stock_code: str) -> None:
-    # Remove from database
-    writeDatabase(connection, f"DELETE FROM stocks WHERE stock_code='{stock_code}';")
-    remove_successful_text = Label(text=f"{stock_code} stocks removed successfully! Please restart the program to remove it from your portfolio.", master=window, font=(font_family, body_font_size))
-    remove_successful_text.grid(row=2, column=0)
+    if code in portfolio:
+        add_status_var.set(f"{code} is already in your portfolio.")
+        return
 
-def updateStockLastUpdated(stock_code: str) -> None:
-    writeDatabase(connection, f"UPDATE stocks SET last_updated=datetime('now', 'localtime') WHERE stock_code='{stock_code}';")
+    # Look the stock up in the background, then add it (the table, database and refreshes are updated from there)
+    worker.submit(engine.fetchNewStock, code, price, quantity, currency, callback=addNewStock)
 
-def updateStockPrice(stock_code: str, current_price: float) -> None:
-    writeDatabase(connection, f"UPDATE stocks SET selling_price={current_price} WHERE stock_code='{stock_code}';")
+def addNewStock(stock: dict) -> None:
+    # The same code added twice quickly is looked up twice, only the first one is kept
+    if stock["stock_code"] in portfolio:
+        add_status_var.set(f"{stock['stock_code']} is already in your portfolio.")
+        return
+    portfolio.add(stock)
 
-def updateStockPriceChange(stock_code: str, price_change: str) -> None:
-    writeDatabase(connection, f"UPDATE stocks SET price_change='{price_change}' WHERE stock_code='{stock_code}';")
+def removeStockFromPortfolio(stock_code: str) -> None:
+    if stock_code in portfolio:
+        portfolio.remove(stock_code)
 
-# Open database
+# Open database (the engine does the data work, the window only shows it)
 file_name = "stocks.db"
-connection = openDatabase(file_name)
-table = readDatabase(connection, "SELECT * FROM stocks;")
+transport = None
+if replay_mode is not None:
+    transport = ReplayTransport(replay_folder, replay_mode, client.getJSON, replay_latency, replay_error_rate, secrets=[exchange_rate_api_key])
+engine = PortfolioEngine(file_name, yahoo_url, exchange_rate_url, exchange_rate_api_key, transport)
+portfolio = engine.portfolio
+history_store = engine.history_store
+rate_table = engine.rate_table
+
+# Triggered alerts also go to a log file and a webhook when they're set
+if alert_log_file is not None:
+    engine.alerts.subscribe(LogSink(alert_log_file))
+webhook = None
+if alert_webhook_url is not None:
+    webhook = WebhookSink(alert_webhook_url)
+    engine.alerts.subscribe(webhook)
+
+# Does all network requests and database writes once the window is open
+worker = BackgroundWorker()
+
+# Decides when each stock is refreshed
+scheduler = RefreshScheduler()
 
 # Show app
 window = Tk()
@@ -413,122 +546,162 @@ title_frame = Frame(master=window, padding=25)
 txt_title = Label(text="Portfolio", master=title_frame, font=(font_family, title_font_size))
 txt_title.pack()
 
-# Stock information frame
-padding = 5
-stock_info_frame = Frame(master=window, padding=10)
-stocks = [[
-    Label(text="", master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-    Label(text="Stock Code", master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-    Label(text="Stock Name", master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-    Label(text="Currency", master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-    Label(text="Stock Price", master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-    Label(text="Quantity", master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-    Label(text="Price Paid", master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-    Label(text="Price Change", master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-    Label(text="Profit/Loss", master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-    Label(text="Last Updated", master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-    Label(text="", master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-]]
-stocks_vars = []
-
-
-def getLiveStockData(i) -> None:
-    stocks_vars[i][0].set()
-
-    stock = table[i]
-    stock_code = stock["stock_code"]
-
-    URL = f"https://query2.finance.yahoo.com/v6/finance/options/{stock_code}"
-
-    try:
-        if stock["stock_name"] == "Error":
-            raise StockNotFoundError
-
-        result = search(URL)
-
-        # For stock price
-        stock_price = str(result["optionChain"]["result"][0]["quote"]["regularMarketPrice"])
-
-        stocks_vars[i][0].set(stock_price)
-
-        updateStockPrice(stock_code, float(stocks_vars[i][0].get()))
-
-        # For stock price change
-        stock_price_change = result["optionChain"]["result"][0]["quote"]["regularMarketChangePercent"]
-
-        if stock_price_change > 0:
-            stocks_vars[i][1][0].set("Increase")
-            stocks_vars[i][1][1].set("#060")
-        elif stock_price_change < 0:
-            stocks_vars[i][1][0].set("Decrease")
-            stocks_vars[i][1][1].set("#F11")
-        else:
-            stocks_vars[i][1][0].set("No change")
-            stocks_vars[i][1][1].set("#000")
-
-        updateStockPriceChange(stock_code, stocks_vars[i][1][0].get())
-
-        # For profit/loss calculation
-        try:
-            stocks_vars[i][2][0].set(str(round(((float(stocks_vars[i][0].get()) * int(stock["quantity"])) - float(stock["buying_price"])), 2)))
-
-            if "-" in stocks_vars[i][2][0].get():
-                stocks_vars[i][2][1].set("#F11")
-            else:
-                stocks_vars[i][2][1].set("#060")
-        except:
-            stocks_vars[i][2][0].set("Error")
-            stocks_vars[i][2][1].set("#000")
-
-        # For last updated time
-        updateStockLastUpdated(stock_code)
-        stocks_vars[i][3].set(str(datetime.now()).split(".")[0])
-
-        # Rerun the function every minute
-        window.after(60000, lambda i=i: getLiveStockData(i))
-    except StockNotFoundError:
-        stocks_vars[i][0].set("Error")
-        stocks_vars[i][1][0].set("Error")
-        stocks_vars[i][1][1].set("#222")
-        stocks_vars[i][2][0].set("Error")
-        stocks_vars[i][2][1].set("#000")
-        stocks_vars[i][3].set("Error")
-    except:
-        stocks_vars[i][3].set(stock["last_updated"])
-
-        # Rerun the function every 2 minutes in case of an error
-        window.after(120000, lambda i=i: getLiveStockData(i))
-
-# Get all the stock information and save it
-print("\nGetting latest stock information, please wait...")
-i = 0
-while i < len(table):
-    stock = table[i]
-
-    stocks_vars.append([
-        StringVar(value="Loading..."),                                  # stock price
-        [StringVar(value="Loading..."), StringVar()], # [price change, text colour]
-        [StringVar(value="Loading..."), StringVar()], # [profit/loss, text colour]
-        StringVar(value="Loading..."),                                  # last updated
-    ])
-
-    getLiveStockData(i)
-
-    stocks.append([
-        Button(text="View Info", master=stock_info_frame, padding=padding, command=lambda code=stock["stock_code"]: StockInfoWindow(window, code)),
-        Label(text=stock["stock_code"], master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-        Label(text=stock["stock_name"], master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-        Label(text=stock["currency"], master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-        Label(textvariable=stocks_vars[i][0], master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-        Label(text=stock["quantity"], master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-        Label(text=stock["buying_price"], master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-        Label(textvariable=stocks_vars[i][1][0], master=stock_info_frame, padding=padding, foreground=stocks_vars[i][1][1].get(), font=(font_family, body_font_size, "bold")),
-        Label(textvariable=stocks_vars[i][2][0], master=stock_info_frame, padding=padding, foreground=stocks_vars[i][2][1].get(), font=(font_family, body_font_size)),
-        Label(textvariable=stocks_vars[i][3], master=stock_info_frame, padding=padding, font=(font_family, body_font_size)),
-        Button(text="Remove", master=stock_info_frame, padding=padding, command=lambda code=stock["stock_code"]: removeStockFromPortfolio(code)),
-    ])
-
-    i += 1
+# Stock information table
+portfolio_grid = PortfolioGrid(window, (font_family, body_font_size),
+                               on_view=lambda code: StockInfoWindow(window, code),
+                               on_remove=lambda code: removeStockFromPortfolio(code))
+
+
+@timed("ui.show_quotes")
+def showQuotes(quotes: 'dict[str, dict]', stock_codes: 'list[str]') -> bool:
+    # Runs on the GUI thread once the quotes have arrived, returns False if any of them failed
+    all_successful = engine.applyQuotes(quotes, stock_codes)
+
+    # Save the whole refresh at once
+    worker.submitDatabase(engine.write_buffer.flush)
+    showTotals()
+
+    # Download new exchange rates in the background when they're too old
+    if rate_table.isStale():
+        worker.submit(rate_table.refresh, callback=showNewRates)
+    return all_successful
+
+def runScheduler() -> None:
+    # One timer for every stock, all stocks that are due are fetched in one batch
+    stock_codes = scheduler.dueCodes()
+    if len(stock_codes):
+        worker.submit(engine.quote_engine.fetchQuotes, stock_codes, True, callback=lambda quotes: showScheduledQuotes(quotes, stock_codes),
+                      error_callback=lambda error: scheduler.fail(stock_codes))
+
+    # Check again when the next stock is due (at least every second, in case stocks are added or watched)
+    next_due = scheduler.nextDue()
+    delay = 1 if next_due is None else min(max(next_due - scheduler.clock(), 0.1), 1)
+    window.after(int(delay * 1000), runScheduler)
+
+def showScheduledQuotes(quotes: 'dict[str, dict]', stock_codes: 'list[str]') -> None:
+    showQuotes(quotes, [stock_code for stock_code in stock_codes if stock_code in portfolio])
+    scheduler.complete(stock_codes, quotes)
+
+def showStockAdded(stock: dict) -> None:
+    portfolio_grid.addRow(stock["stock_code"], {**stock, "selling_price": "Loading...", "price_change": "Loading...",
+                                                "profit_loss": "Loading...", "last_updated": "Loading..."})
+    add_status_var.set(f"{stock['quantity']} {stock['stock_code']} stocks added successfully!")
+
+def startRefreshing(stock: dict) -> None:
+    # Stocks that couldn't be found are shown as errors and never refreshed (the same as at startup)
+    if stock["stock_name"] == "Error":
+        engine.getLiveStockData(stock, None)
+        return
+    scheduler.add(stock["stock_code"])
+
+    # The quote fetched while adding the stock is still cached, so the first refresh uses it instead of asking again
+    quote = engine.quote_engine.cache.get(stock["stock_code"])
+    if quote is not None:
+        showScheduledQuotes({stock["stock_code"]: quote}, [stock["stock_code"]])
+
+def showStockRemoved(stock: dict) -> None:
+    portfolio_grid.removeRow(stock["stock_code"])
+    remove_status_var.set(f"{stock['stock_code']} stocks removed successfully!")
+
+def showTotals() -> None:
+    # Converts every stock into the reporting currency at once using the stored rates
+    totals = engine.totals(reporting_currency_var.get().strip().upper())
+    text = f"Total Value: {totals['value']:,.2f} {totals['currency']}    Profit/Loss: {totals['profit_loss']:,.2f} {totals['currency']}"
+    if totals["missing"]:
+        text += f"    ({totals['missing']} stocks not counted)"
+    totals_var.set(text)
+
+def showAlerts(alerts: 'list[dict]') -> None:
+    # Runs on the GUI thread during showQuotes, the newest alerts replace the last ones shown
+    text = "    ".join(describeAlert(alert) for alert in alerts[:3])
+    if len(alerts) > 3:
+        text += f"    (and {len(alerts) - 3} more)"
+    alert_var.set(f"Alert: {text}")
+    window.bell()
+
+def runAnalytics() -> None:
+    # Adds new (and revised) daily bars to the portfolio analytics in the background, then again every analytics_interval
+    updateNextHolding(iter([stock["stock_code"] for stock in portfolio if stock["stock_name"] != "Error"]))
+
+def updateNextHolding(stock_codes) -> None:
+    # One holding at a time, each started once the last has finished, so only one fetch worker is used
+    # and closing the window only waits for the chart that's loading
+    stock_code = next(stock_codes, None)
+    while stock_code is not None and stock_code not in portfolio:
+        stock_code = next(stock_codes, None)
+
+    if stock_code is None:
+        worker.submit(engine.analyticsSummary, reporting_currency_var.get().strip().upper(), callback=showAnalytics,
+                      error_callback=lambda error: window.after(analytics_interval * 1000, runAnalytics))
+        return
+    worker.submit(engine.refreshHoldingAnalytics, stock_code, callback=lambda new_bars: updateNextHolding(stock_codes),
+                  error_callback=lambda error: updateNextHolding(stock_codes))
+
+def showAnalytics(analytics: dict) -> None:
+    summary = analytics["portfolio"]
+    if summary["bars"] < 2 or np.isnan(summary["volatility"]):
+        analytics_var.set("Portfolio Statistics: Not enough data")
+    else:
+        analytics_var.set(f"Portfolio Day Return: {summary['return']:+.2%}    Volatility: {summary['volatility']:.2%}    "
+                          f"Max Drawdown (1y): {summary['max_drawdown']:.2%}")
+    window.after(analytics_interval * 1000, runAnalytics)
+
+def showNewRates(changed: bool) -> None:
+    if changed:
+        reporting_currency_field.configure(values=rate_table.currencies())
+        showTotals()
+
+# Show the last saved values until the first refresh arrives
+for stock in portfolio:
+    portfolio_grid.addRow(stock["stock_code"], {"profit_loss": "Loading...", **stock})
+
+# The table, the database and refreshes all follow changes to the portfolio
+portfolio.subscribe("add", showStockAdded)
+portfolio.subscribe("remove", showStockRemoved)
+portfolio.subscribe("update", portfolio_grid.updateRow)
+portfolio.subscribe("add", lambda stock: worker.submitDatabase(engine.insertStock, stock))
+portfolio.subscribe("remove", lambda stock: worker.submitDatabase(engine.deleteStock, stock))
+portfolio.subscribe("add", startRefreshing)
+portfolio.subscribe("remove", lambda stock: scheduler.remove(stock["stock_code"]))
+portfolio.subscribe("add", lambda stock: showTotals())
+portfolio.subscribe("remove", lambda stock: showTotals())
+
+# Portfolio totals
+totals_frame = Frame(master=window, padding=5)
+totals_var = StringVar()
+totals_text = Label(textvariable=totals_var, master=totals_frame, font=(font_family, body_font_size))
+reporting_currency_var = StringVar(value=reporting_currency)
+reporting_currency_field = Combobox(master=totals_frame, textvariable=reporting_currency_var, width=6,
+                                    values=rate_table.currencies() or [reporting_currency])
+reporting_currency_field.bind("<<ComboboxSelected>>", lambda event: showTotals())
+reporting_currency_field.bind("<Return>", lambda event: showTotals())
+
+totals_text.grid(row=0, column=0, padx=5)
+reporting_currency_field.grid(row=0, column=1, padx=5)
+showTotals()
+
+# Portfolio return, volatility and drawdown from the daily history
+analytics_var = StringVar(value="Portfolio Statistics: Loading...")
+analytics_text = Label(textvariable=analytics_var, master=totals_frame, font=(font_family, body_font_size))
+analytics_text.grid(row=1, column=0, columnspan=2)
+
+# Latest triggered alerts
+alert_var = StringVar()
+alert_text = Label(textvariable=alert_var, master=totals_frame, foreground="#F11", font=(font_family, body_font_size))
+alert_text.grid(row=2, column=0, columnspan=2)
+engine.alerts.subscribe(showAlerts)
+
+# Fill in every row with one batched refresh once the window is open
+worker.startPolling(window)
+watchStalls(window)
+startLogging(window)
+for stock in portfolio:
+    if stock["stock_name"] == "Error":
+        engine.getLiveStockData(stock, None)
+    else:
+        scheduler.add(stock["stock_code"])
+runScheduler()
+runAnalytics()
 
 # Add new stocks
 add_frame = Frame(master=window, padding=10)
@@ -553,16 +726,29 @@ currency_help.grid(row=0, column=3)
 currency_field.grid(row=1, column=3)
 submit_button.grid(row=1, column=4)
 
-# Display stored stock widgets
-for i in range(len(table)+1):
-    for j in range(len(stocks[0])):
-        stocks[i][j].grid(row=i, column=j)
-
 title_frame.grid(row=0, column=0)
-stock_info_frame.grid(row=1, column=0)
-add_frame.grid(row=3, column=0)
+portfolio_grid.grid(row=1, column=0, padx=10, pady=10)
+add_status_var = StringVar()
+add_status_text = Label(textvariable=add_status_var, master=add_frame, font=(font_family, body_font_size))
+add_status_text.grid(row=2, columnspan=4)
+
+remove_status_var = StringVar()
+remove_status_text = Label(textvariable=remove_status_var, master=window, font=(font_family, body_font_size))
+remove_status_text.grid(row=3, column=0)
+
+totals_frame.grid(row=2, column=0)
+add_frame.grid(row=4, column=0)
+
+# The startup capture ends once the window has been drawn for the first time
+if startup_profiler is not None:
+    window.after_idle(lambda: print(f"Startup profile saved to {startup_profiler.stop()}"))
 
 window.mainloop()
 
-# Close database and exit
-closeDatabase(connection)
+# Finish any database writes, then close database and connections and exit
+worker.shutdown()
+if webhook is not None:
+    # Send alerts that are still waiting
+    webhook.close()
+engine.close()
+printSummary()
@@ -0,0 +1,210 @@
+import functools                        # For keeping the names of timed functions
+import os                               # For turning metrics on without changing any code
+import sys                              # For printing the summary
+import threading                        # For recording from more than one thread
+import time                             # For timing
+from collections import deque           # For keeping recent timings
+
+# Set STOCK_TRACKER_METRICS=1 to record timings, everything below does (almost) nothing otherwise
+enabled = os.environ.get("STOCK_TRACKER_METRICS", "") not in ["", "0"]
+
+# Number of recent timings kept for each name
+max_samples = 1000
+
+# Milliseconds between UI stall checks and between summary lines
+stall_interval = 100
+log_interval = 30000
+
+
+def percentile(values: 'list[float]', fraction: float) -> float:
+    # values must be sorted
+    if len(values) == 0:
+        return 0
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+class Metrics():
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.timings = {}       # name -> recent durations in seconds
+        self.totals = {}        # name -> [number of timings, total seconds]
+        self.counters = {}
+        self.sources = {}       # name -> function returning a stats dict (e.g. a cache's stats)
+
+    def record(self, name: str, seconds: float) -> None:
+        with self.lock:
+            if name not in self.timings:
+                self.timings[name] = deque(maxlen=max_samples)
+                self.totals[name] = [0, 0.0]
+            self.timings[name].append(seconds)
+            self.totals[name][0] += 1
+            self.totals[name][1] += seconds
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def addSource(self, name: str, stats) -> None:
+        self.sources[name] = stats
+
+    def reset(self) -> None:
+        with self.lock:
+            self.timings.clear()
+            self.totals.clear()
+            self.counters.clear()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            timings = {name: sorted(values) for name, values in self.timings.items()}
+            totals = {name: list(total) for name, total in self.totals.items()}
+            counters = dict(self.counters)
+
+        result = {"timings": {}, "counters": counters, "sources": {}}
+        for name, values in timings.items():
+            result["timings"][name] = {"count": totals[name][0], "total": totals[name][1],
+                                       "p50": percentile(values, 0.5), "p95": percentile(values, 0.95),
+                                       "max": values[-1] if len(values) else 0}
+        for name, stats in list(self.sources.items()):
+            try:
+                result["sources"][name] = stats()
+            except:
+                pass
+        return result
+
+    def summary(self) -> str:
+        # One line with every timing (p50/p95 in milliseconds), counter and source
+        snapshot = self.snapshot()
+        parts = []
+        for name, timing in sorted(snapshot["timings"].items()):
+            parts.append(f"{name} n={timing['count']} p50={timing['p50']*1000:.1f}ms p95={timing['p95']*1000:.1f}ms")
+        for name, value in sorted(snapshot["counters"].items()):
+            parts.append(f"{name}={value}")
+        for name, stats in sorted(snapshot["sources"].items()):
+            if "hit_rate" in stats:
+                parts.append(f"{name} hit rate={stats['hit_rate']:.0%}")
+            if "requests" in stats:
+                parts.append(f"{name} requests={stats['requests']}")
+        return " | ".join(parts) if len(parts) else "No metrics recorded"
+
+
+# Shared by every module
+metrics = Metrics()
+
+
+class NoTimer():
+    # Used instead of Timer when metrics are off
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exception) -> None:
+        pass
+
+
+class Timer():
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exception) -> None:
+        metrics.record(self.name, time.perf_counter() - self.start)
+
+
+no_timer = NoTimer()
+
+
+def timer(name: str):
+    # with timer("name"): ... records how long the block took
+    return Timer(name) if enabled else no_timer
+
+def timed(name: str):
+    # Decorator that records how long every call took (including ones that raise)
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics.record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def count(name: str, amount: int = 1) -> None:
+    if enabled:
+        metrics.count(name, amount)
+
+def watchStalls(window, interval: int = stall_interval) -> None:
+    # Checks in with the Tk event loop every interval ms, anything later than that is time the UI was frozen
+    if not enabled:
+        return
+
+    def check(expected: float) -> None:
+        now = time.perf_counter()
+        stall = now - expected
+        if stall > 0.01:
+            metrics.record("ui.stall", stall)
+            metrics.count("ui.stall_ms", int(stall * 1000))
+        window.after(interval, check, now + interval / 1000)
+
+    window.after(interval, check, time.perf_counter() + interval / 1000)
+
+def startLogging(window, interval: int = log_interval) -> None:
+    # Prints a summary line every interval ms while the window is open
+    if not enabled:
+        return
+
+    def log() -> None:
+        printSummary()
+        window.after(interval, log)
+
+    window.after(interval, log)
+
+
+def printSummary() -> None:
+    if enabled:
+        print(f"[metrics] {metrics.summary()}", file=sys.stderr)
+
+
+class Profiler():
+    # Opt-in capture of a section of the app (e.g. startup), kind is "cprofile" or "pyinstrument"
+    def __init__(self, kind: str, output: str) -> None:
+        self.kind = kind
+        self.output = output
+
+        if kind == "cprofile":
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif kind == "pyinstrument":
+            # Optional, only needed when it's asked for
+            try:
+                from pyinstrument import Profiler as Instrument
+            except ImportError:
+                raise ImportError("pyinstrument isn't installed, run \"pip install pyinstrument\" or use cprofile instead") from None
+            self.profiler = Instrument()
+            self.profiler.start()
+        else:
+            raise ValueError(f"Unknown profiler {kind}, expected cprofile or pyinstrument")
+
+    def stop(self) -> str:
+        # Saves the capture and returns where it was saved
+        if self.kind == "cprofile":
+            self.profiler.disable()
+            self.profiler.dump_stats(self.output)
+        else:
+            self.profiler.stop()
+            with open(self.output, "w") as file:
+                file.write(self.profiler.output_html())
+        return self.output
+
+def startProfile() -> 'Profiler | None':
+    # Set STOCK_TRACKER_PROFILE=cprofile (or pyinstrument) to capture startup, saved to startup.prof (or startup.html)
+    kind = os.environ.get("STOCK_TRACKER_PROFILE", "")
+    if kind == "":
+        return None
+    return Profiler(kind, "startup.prof" if kind == "cprofile" else "startup.html")
@@ -0,0 +1,139 @@
+# Offline stand-in for the Yahoo Finance and exchange rate APIs
+# Run with "python mock_server.py" and point yahoo_url in main.py at it
+
+import json                                                 # For building responses
+import threading                                            # For running the server in the background
+import time                                                 # For timestamps
+import zlib                                                 # For stable per-symbol numbers
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+# Seconds between chart points for each interval
+interval_seconds = {"1m": 60, "1d": 86400, "1wk": 604800, "1mo": 2592000}
+
+# Number of seconds covered by each chart range
+range_seconds = {"1d": 86400, "5d": 432000, "1mo": 2592000, "3mo": 7776000, "6mo": 15552000,
+                 "ytd": 31536000, "1y": 31536000, "2y": 63072000, "5y": 157680000, "max": 946080000}
+
+# Rates against USD used for every base currency
+usd_rates = {"USD": 1.0, "EUR": 0.92, "GBP": 0.78, "HKD": 7.81, "JPY": 157.0, "AUD": 1.5, "CAD": 1.37, "INR": 83.6}
+
+
+def symbolPrice(stock_code: str, timestamp: float = 0) -> float:
+    # Same symbol always starts from the same price, then drifts slowly over time
+    seed = zlib.crc32(stock_code.encode())
+    base = 10 + seed % 500
+    drift = ((seed >> 9) % 200 - 100) / 10000
+    return round(base * (1 + drift * ((timestamp // 60) % 100) / 100), 2)
+
+def quoteFor(stock_code: str) -> dict:
+    now = time.time()
+    price = symbolPrice(stock_code, now)
+    previous_close = symbolPrice(stock_code)
+    return {
+        "symbol": stock_code,
+        "shortName": f"{stock_code} Corp.",
+        "currency": "HKD" if stock_code.endswith(".HK") else "USD",
+        "marketState": "REGULAR",
+        "regularMarketPrice": price,
+        "regularMarketOpen": previous_close,
+        "regularMarketPreviousClose": previous_close,
+        "regularMarketDayHigh": max(price, previous_close),
+        "regularMarketDayLow": min(price, previous_close),
+        "regularMarketChangePercent": round((price - previous_close) / previous_close * 100, 4),
+        "regularMarketTime": int(now),
+    }
+
+def chartFor(stock_code: str, query: dict) -> dict:
+    interval = interval_seconds.get(query.get("interval", ["1d"])[0], 86400)
+    end = int(query.get("period2", [time.time()])[0])
+    if "period1" in query:
+        start = int(query["period1"][0])
+    else:
+        start = end - range_seconds.get(query.get("range", ["1mo"])[0], 2592000)
+
+    # Line up points on the interval so repeated requests return the same bars
+    timestamps = list(range(start - start % interval + interval, end + 1, interval))
+    closes = [symbolPrice(stock_code, t * 60 // interval) for t in timestamps]
+    return {"chart": {"result": [{
+        "meta": {"symbol": stock_code, "currency": "USD"},
+        "timestamp": timestamps,
+        "indicators": {"quote": [{
+            "open": [round(c * 0.995, 2) for c in closes],
+            "high": [round(c * 1.01, 2) for c in closes],
+            "low": [round(c * 0.99, 2) for c in closes],
+            "close": closes,
+            "volume": [1000 + t % 997 for t in timestamps],
+        }]},
+    }], "error": None}}
+
+def ratesFor(base: str) -> dict:
+    base_rate = usd_rates.get(base, 1.0)
+    return {"result": "success", "base_code": base,
+            "conversion_rates": {code: round(rate / base_rate, 6) for code, rate in usd_rates.items()}}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+
+        with self.server.lock:
+            self.server.request_count += 1
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if parts[:3] == ["v7", "finance", "quote"]:
+            symbols = [code for code in query.get("symbols", [""])[0].split(",") if code]
+            body = {"quoteResponse": {"result": [quoteFor(code) for code in symbols], "error": None}}
+        elif parts[:3] == ["v6", "finance", "options"] and len(parts) == 4:
+            body = {"optionChain": {"result": [{"quote": quoteFor(parts[3])}], "error": None}}
+        elif parts[:3] == ["v8", "finance", "chart"] and len(parts) == 4:
+            body = chartFor(parts[3], query)
+        elif len(parts) == 4 and parts[0] == "v6" and parts[2] == "latest":
+            body = ratesFor(parts[3])
+        else:
+            self.send_error(404)
+            return
+
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args) -> None:
+        # Keep the console quiet
+        pass
+
+
+def startMockServer(port: int = 0, latency: float = 0) -> 'tuple[ThreadingHTTPServer, str]':
+    # Starts the server on a background thread and returns it with its base URL
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.latency = latency
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Yahoo Finance and exchange rate APIs")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0, help="Seconds to wait before every response")
+    args = parser.parse_args()
+
+    server, base_url = startMockServer(args.port, args.latency)
+    print(f"Mock server running at {base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,59 @@
+# Events sent to subscribers, with the arguments they're called with
+# "add": (stock)  "remove": (stock)  "update": (stock_code, changed values)
+portfolio_events = ["add", "remove", "update"]
+
+
+class Portfolio():
+    def __init__(self, stocks: 'list[dict]' = []) -> None:
+        # stock code -> row from the stocks table (plus values worked out while running, like profit_loss)
+        self.stocks = {stock["stock_code"]: dict(stock) for stock in stocks}
+        self.listeners = {event: [] for event in portfolio_events}
+
+    def subscribe(self, event: str, callback) -> None:
+        self.listeners[event].append(callback)
+
+    def unsubscribe(self, event: str, callback) -> None:
+        self.listeners[event].remove(callback)
+
+    def emit(self, event: str, *args) -> None:
+        for callback in list(self.listeners[event]):
+            callback(*args)
+
+    def __contains__(self, stock_code: str) -> bool:
+        return stock_code in self.stocks
+
+    def __iter__(self):
+        return iter(list(self.stocks.values()))
+
+    def __len__(self) -> int:
+        return len(self.stocks)
+
+    def get(self, stock_code: str) -> 'dict | None':
+        return self.stocks.get(stock_code)
+
+    def codes(self) -> 'list[str]':
+        return list(self.stocks.keys())
+
+    def add(self, stock: dict) -> None:
+        if stock["stock_code"] in self.stocks:
+            raise KeyError(f"{stock['stock_code']} is already in the portfolio")
+
+        self.stocks[stock["stock_code"]] = dict(stock)
+        self.emit("add", self.stocks[stock["stock_code"]])
+
+    def remove(self, stock_code: str) -> None:
+        stock = self.stocks.pop(stock_code)
+        self.emit("remove", stock)
+
+    def update(self, stock_code: str, values: dict) -> None:
+        # Only values that actually changed are sent to subscribers
+        stock = self.stocks.get(stock_code)
+        if stock is None:
+            return
+
+        changed = {key: value for key, value in values.items() if stock.get(key) != value}
+        if len(changed) == 0:
+            return
+
+        stock.update(changed)
+        self.emit("update", stock_code, changed)
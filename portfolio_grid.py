@@ -0,0 +1,112 @@
+from tkinter import *                   # For GUI
+from tkinter.ttk import *               # For GUI
+
+# (column id, heading, width in pixels) for every column in the table, ids match the portfolio's values
+grid_columns = [("stock_code", "Stock Code", 90),
+                ("stock_name", "Stock Name", 200),
+                ("currency", "Currency", 70),
+                ("selling_price", "Stock Price", 90),
+                ("quantity", "Quantity", 70),
+                ("buying_price", "Price Paid", 90),
+                ("price_change", "Price Change", 100),
+                ("profit_loss", "Profit/Loss", 90),
+                ("last_updated", "Last Updated", 150)]
+
+column_ids = [column[0] for column in grid_columns]
+
+# Text colour of a row for each price change
+row_colours = {"Increase": "#060", "Decrease": "#F11", "No change": "#000", "Error": "#222"}
+
+# Background of rows that are making a loss overall (Treeview can't colour one cell, so the text colour is left to the price change)
+loss_tag = "Loss"
+loss_colour = "#FDD"
+
+
+class PortfolioGrid():
+    def __init__(self, master, font: tuple, height: int = 15, on_view=None, on_remove=None) -> None:
+        # Only the rows that can be seen are drawn, so thousands of stocks don't slow the window down
+        self.frame = Frame(master=master)
+
+        style = Style(master)
+        style.configure("Portfolio.Treeview", font=font, rowheight=int(font[1] * 2.2))
+        style.configure("Portfolio.Treeview.Heading", font=font)
+
+        self.tree = Treeview(master=self.frame, columns=column_ids, show="headings", height=height,
+                             selectmode="browse", style="Portfolio.Treeview")
+        for column, heading, width in grid_columns:
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=width, anchor="center")
+        for text, colour in row_colours.items():
+            self.tree.tag_configure(text, foreground=colour)
+        self.tree.tag_configure(loss_tag, background=loss_colour)
+
+        scrollbar = Scrollbar(master=self.frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+
+        # Buttons work on the selected row
+        button_frame = Frame(master=self.frame, padding=5)
+        Button(text="View Info", master=button_frame, command=lambda: self.selectedDo(on_view)).grid(row=0, column=0, padx=5)
+        Button(text="Remove", master=button_frame, command=lambda: self.selectedDo(on_remove)).grid(row=0, column=1, padx=5)
+        self.tree.bind("<Double-1>", lambda event: self.selectedDo(on_view))
+
+        self.tree.grid(row=0, column=0, sticky="NSEW")
+        scrollbar.grid(row=0, column=1, sticky="NS")
+        button_frame.grid(row=1, column=0, columnspan=2)
+
+        # stock code -> list of the values currently shown, in column order
+        self.rows = {}
+
+    def grid(self, **kwargs) -> None:
+        self.frame.grid(**kwargs)
+
+    def selectedDo(self, function) -> None:
+        selection = self.tree.selection()
+        if function is not None and len(selection):
+            function(selection[0])
+
+    def cellText(self, value) -> str:
+        # Values that couldn't be worked out are stored as None
+        return "Error" if value is None else str(value)
+
+    def rowTags(self, row: 'list[str]') -> tuple:
+        # The price change colours the text, a negative profit/loss adds the loss background
+        tags = (row[column_ids.index("price_change")],)
+        try:
+            if float(row[column_ids.index("profit_loss")]) < 0:
+                tags += (loss_tag,)
+        except ValueError:
+            # Still loading or couldn't be worked out
+            pass
+        return tags
+
+    def addRow(self, stock_code: str, values: dict) -> None:
+        row = [self.cellText(values.get(column, "")) for column in column_ids]
+        self.rows[stock_code] = row
+        self.tree.insert("", "end", iid=stock_code, values=row, tags=self.rowTags(row))
+
+    def updateRow(self, stock_code: str, values: dict) -> int:
+        # Only changed cells are sent to Tk, returns how many there were
+        row = self.rows[stock_code]
+        changed = 0
+
+        for column, value in values.items():
+            # Values that aren't shown in the table are ignored
+            if column not in column_ids:
+                continue
+
+            i = column_ids.index(column)
+            value = self.cellText(value)
+            if row[i] != value:
+                row[i] = value
+                self.tree.set(stock_code, column, value)
+                changed += 1
+
+        if "price_change" in values or "profit_loss" in values:
+            self.tree.item(stock_code, tags=self.rowTags(row))
+
+        return changed
+
+    def removeRow(self, stock_code: str) -> None:
+        if stock_code in self.rows:
+            del self.rows[stock_code]
+            self.tree.delete(stock_code)
@@ -0,0 +1,122 @@
+import threading                            # For sharing the cache between threads
+import time                                 # For checking how old cached quotes are
+from collections import OrderedDict         # For keeping cached quotes in least recently used order
+from urllib.parse import quote as urlQuote   # For escaping stock codes in URLs
+from metrics import timed                    # For timing fetches when metrics are on
+
+# Default Yahoo Finance host (can be pointed at mock_server.py for offline testing)
+yahoo_url = "https://query2.finance.yahoo.com"
+
+# Maximum number of stock codes to ask for in a single request
+batch_size = 50
+
+# Seconds a fetched quote can be reused for, and the most quotes to keep at once
+quote_ttl = 30
+quote_cache_size = 1000
+
+
+class QuoteCache():
+    def __init__(self, ttl: float = quote_ttl, max_size: int = quote_cache_size, clock=time.monotonic) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+
+        # stock code -> (time fetched, quote)
+        self.quotes = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, stock_code: str) -> 'dict | None':
+        with self.lock:
+            entry = self.quotes.get(stock_code)
+            if entry is None or self.clock() - entry[0] >= self.ttl:
+                self.misses += 1
+                return None
+
+            self.quotes.move_to_end(stock_code)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, stock_code: str, quote: dict) -> None:
+        with self.lock:
+            self.quotes[stock_code] = (self.clock(), quote)
+            self.quotes.move_to_end(stock_code)
+
+            # Remove the least recently used quotes
+            while len(self.quotes) > self.max_size:
+                self.quotes.popitem(last=False)
+
+    def invalidate(self, stock_code: str = None) -> None:
+        with self.lock:
+            if stock_code is None:
+                self.quotes.clear()
+            else:
+                self.quotes.pop(stock_code, None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.quotes),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0,
+            }
+
+
+class QuoteEngine():
+    def __init__(self, search, base_url: str = yahoo_url, batch_size: int = batch_size, cache: QuoteCache = None) -> None:
+        # search(URL) -> dict is passed in so the engine doesn't care how requests are made
+        self.search = search
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self.cache = cache if cache is not None else QuoteCache()
+
+        self.request_count = 0
+        self.error_count = 0
+
+    def batchURL(self, stock_codes: 'list[str]') -> str:
+        symbols = ",".join(urlQuote(code, safe="") for code in stock_codes)
+        return f"{self.base_url}/v7/finance/quote?symbols={symbols}"
+
+    @timed("quotes.fetch")
+    def fetchQuotes(self, stock_codes: 'list[str]', fresh: bool = False) -> 'dict[str, dict]':
+        # Remove duplicates but keep the order
+        stock_codes = list(dict.fromkeys(stock_codes))
+        quotes = {}
+
+        # Only ask for quotes that haven't been fetched recently (unless fresh ones are needed)
+        missing = []
+        for code in stock_codes:
+            cached = None if fresh else self.cache.get(code)
+            if cached is None:
+                missing.append(code)
+            else:
+                quotes[code] = cached
+
+        # Ask for the quotes in as few requests as possible
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start+self.batch_size]
+
+            self.request_count += 1
+            # Yahoo sends symbols back in upper case, so match them to the codes as they were asked for (e.g. "aapl")
+            requested = {}
+            for code in batch:
+                requested.setdefault(code.upper(), []).append(code)
+
+            try:
+                result = self.search(self.batchURL(batch))
+                for info in result["quoteResponse"]["result"]:
+                    for code in requested.get(str(info["symbol"]).upper(), []):
+                        quotes[code] = info
+                        self.cache.put(code, info)
+            except:
+                # Skip this batch, the missing stock codes will be treated as errors
+                self.error_count += 1
+
+        return quotes
+
+    def fetchQuote(self, stock_code: str) -> 'dict | None':
+        return self.fetchQuotes([stock_code]).get(stock_code)
@@ -0,0 +1,181 @@
+import gzip                             # For compressing recorded responses
+import hashlib                          # For naming recordings after their contents
+import json                             # For reading and writing responses
+import os                               # For the recordings folder
+import random                           # For injecting errors
+import re                               # For taking the time out of chart URLs
+import threading                        # For recording from more than one thread
+import time                             # For injecting latency
+from urllib.parse import urlsplit, parse_qs, quote as urlQuote   # For splitting quote batches into one recording per symbol
+
+# Folder recordings are saved in when none is given
+fixtures_folder = "fixtures"
+
+# Modes a ReplayTransport can run in
+replay_modes = ["record", "replay"]
+
+# Chart downloads end at the time they were made, which is never the same twice
+period_end = re.compile(r"([?&]period2=)\d+")
+
+# Quote batches are saved one symbol at a time, so they can be replayed in whatever batches the scheduler makes
+quote_path = "/v7/finance/quote"
+
+
+class ReplayError(ConnectionError):
+    # Raised instead of a real network error, so callers handle it the same way
+    pass
+
+
+class ReplayTransport():
+    def __init__(self, folder: str = fixtures_folder, mode: str = "replay", fetch=None, latency: float = 0,
+                 error_rate: float = 0, seed: int = None, secrets: 'list[str]' = []) -> None:
+        # In record mode every response from fetch(URL) is saved, in replay mode they're served back without a network
+        if mode not in replay_modes:
+            raise ValueError(f"Unknown replay mode {mode}, expected one of {replay_modes}")
+        if mode == "record" and fetch is None:
+            raise ValueError("Recording needs a fetch function")
+
+        self.folder = folder
+        self.mode = mode
+        self.fetch = fetch
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        # API keys are taken out of URLs so they aren't saved in the index
+        self.secrets = [secret for secret in secrets if secret]
+
+        # URL -> hash of the response, the responses themselves are saved once per distinct body
+        self.index_path = os.path.join(folder, "index.json")
+        try:
+            with open(self.index_path, "r") as file:
+                self.index = json.load(file)
+        except FileNotFoundError:
+            self.index = {}
+
+        self.request_count = 0
+        self.miss_count = 0
+        self.injected_errors = 0
+
+    def key(self, URL: str) -> str:
+        for secret in self.secrets:
+            URL = URL.replace(secret, "{key}")
+        return period_end.sub(r"\1{now}", URL)
+
+    def quoteSymbols(self, URL: str) -> 'list[str] | None':
+        # The symbols asked for if URL is a quote batch, otherwise None
+        parts = urlsplit(URL)
+        symbols = parse_qs(parts.query).get("symbols")
+        if not parts.path.endswith(quote_path) or symbols is None:
+            return None
+        return [symbol for symbol in symbols[0].split(",") if symbol]
+
+    def symbolKey(self, URL: str, symbol: str) -> str:
+        # Yahoo sends symbols back in upper case, so that's what they're saved as
+        return self.key(f"{URL.split('?')[0]}?symbols={urlQuote(symbol.upper(), safe='')}")
+
+    def objectPath(self, digest: str) -> str:
+        return os.path.join(self.folder, "objects", digest[:2], f"{digest}.json.gz")
+
+    def getJSON(self, URL: str) -> dict:
+        with self.lock:
+            self.request_count += 1
+
+        if self.mode == "record":
+            return self.record(URL)
+        return self.replay(URL)
+
+    def getBytes(self, URL: str) -> bytes:
+        # The response body as JSON bytes, replayed bodies are served without being parsed
+        with self.lock:
+            self.request_count += 1
+
+        if self.mode == "record":
+            return json.dumps(self.record(URL)).encode()
+        return self.replayBytes(URL)
+
+    def record(self, URL: str) -> dict:
+        result = self.fetch(URL)
+
+        symbols = self.quoteSymbols(URL)
+        if symbols is None:
+            responses = {self.key(URL): result}
+        else:
+            # One response per symbol (symbols Yahoo didn't know get an empty one)
+            quotes = {}
+            for info in result["quoteResponse"]["result"]:
+                quotes[str(info["symbol"]).upper()] = info
+            responses = {self.symbolKey(URL, symbol): {"quoteResponse": {"result": [quotes[symbol.upper()]] if symbol.upper() in quotes else [],
+                                                                         "error": None}}
+                         for symbol in symbols}
+
+        with self.lock:
+            for key, response in responses.items():
+                body = json.dumps(response, sort_keys=True, separators=(",", ":")).encode()
+                digest = hashlib.sha256(body).hexdigest()
+
+                # Identical responses (e.g. the same quote fetched twice) share one file
+                path = self.objectPath(digest)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with gzip.open(path + ".tmp", "wb") as file:
+                        file.write(body)
+                    os.replace(path + ".tmp", path)
+                self.index[key] = digest
+
+            with open(self.index_path + ".tmp", "w") as file:
+                json.dump(self.index, file, indent=1, sort_keys=True)
+            os.replace(self.index_path + ".tmp", self.index_path)
+
+        return result
+
+    def replay(self, URL: str) -> dict:
+        return json.loads(self.replayBytes(URL))
+
+    def replayBytes(self, URL: str) -> bytes:
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.lock:
+            failed = self.error_rate and self.random.random() < self.error_rate
+            if failed:
+                self.injected_errors += 1
+        if failed:
+            raise ReplayError(f"Injected error for {self.key(URL)}")
+
+        symbols = self.quoteSymbols(URL)
+        if symbols is not None:
+            return self.replayQuotes(URL, symbols)
+
+        digest = self.index.get(self.key(URL))
+        if digest is None:
+            with self.lock:
+                self.miss_count += 1
+            raise ReplayError(f"Nothing recorded for {self.key(URL)}")
+        return self.load(digest)
+
+    def replayQuotes(self, URL: str, symbols: 'list[str]') -> bytes:
+        # Puts a batch back together from each symbol's recording, symbols never recorded are left out (as Yahoo does with unknown ones)
+        digests = [self.index.get(self.symbolKey(URL, symbol)) for symbol in symbols]
+        missing = digests.count(None)
+        if missing:
+            with self.lock:
+                self.miss_count += missing
+            if missing == len(symbols):
+                raise ReplayError(f"Nothing recorded for {self.key(URL)}")
+
+        quotes = []
+        for digest in digests:
+            if digest is not None:
+                quotes += json.loads(self.load(digest))["quoteResponse"]["result"]
+        return json.dumps({"quoteResponse": {"result": quotes, "error": None}}).encode()
+
+    def load(self, digest: str) -> bytes:
+        with gzip.open(self.objectPath(digest), "rb") as file:
+            return file.read()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"mode": self.mode, "requests": self.request_count, "recorded_urls": len(self.index),
+                    "misses": self.miss_count, "injected_errors": self.injected_errors}
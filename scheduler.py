@@ -0,0 +1,165 @@
+import heapq                            # For finding the next stock that needs refreshing
+import random                           # For spreading out retries
+import time                             # For the real clock
+
+# Seconds between refreshes in each situation
+base_interval = 60              # Market open and the price is moving
+watched_interval = 15           # An info window is open for the stock
+closed_interval = 900           # The stock's market is closed
+max_unchanged_interval = 300    # Longest wait when the price keeps staying the same
+error_interval = 120            # First retry after an error, doubled for every error in a row
+max_error_interval = 1800       # Longest wait between retries
+
+# Stocks due within this many seconds of each other are fetched together
+coalesce_window = 5
+
+# How much retries are randomly moved by (0.2 = up to 20% earlier or later)
+jitter = 0.2
+
+# Yahoo market states that count as the market being open
+open_market_states = ["REGULAR"]
+
+
+class SimulatedClock():
+    # Stands in for time.monotonic so the scheduler can be tested without waiting
+    def __init__(self, start: float = 0) -> None:
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class SymbolState():
+    __slots__ = ["due", "tracked", "watchers", "last_price", "unchanged", "errors"]
+
+    def __init__(self, due: float) -> None:
+        self.due = due           # Infinity until the stock is scheduled
+        self.tracked = False     # In the portfolio
+        self.watchers = []       # Callbacks of open info windows
+        self.last_price = None
+        self.unchanged = 0       # Refreshes in a row without the price moving
+        self.errors = 0          # Failed refreshes in a row
+
+
+class RefreshScheduler():
+    def __init__(self, clock=time.monotonic, random=random.random) -> None:
+        self.clock = clock
+        self.random = random
+
+        # (due time, order added, stock code), old entries are skipped when they come up
+        self.queue = []
+        self.counter = 0
+        self.symbols = {}
+        self.in_flight = set()
+
+        self.fetch_count = 0
+
+    def schedule(self, stock_code: str, due: float) -> None:
+        state = self.symbols[stock_code]
+        state.due = due
+        self.counter += 1
+        heapq.heappush(self.queue, (due, self.counter, stock_code))
+
+    def symbol(self, stock_code: str) -> SymbolState:
+        if stock_code not in self.symbols:
+            self.symbols[stock_code] = SymbolState(float("inf"))
+        return self.symbols[stock_code]
+
+    def add(self, stock_code: str) -> None:
+        # Portfolio stocks are refreshed until they're removed, starting now
+        state = self.symbol(stock_code)
+        state.tracked = True
+        self.schedule(stock_code, self.clock())
+
+    def remove(self, stock_code: str) -> None:
+        state = self.symbols.get(stock_code)
+        if state is None:
+            return
+
+        state.tracked = False
+        if len(state.watchers) == 0:
+            del self.symbols[stock_code]
+
+    def watch(self, stock_code: str, callback) -> None:
+        # callback(quote) is run after every refresh of the stock, which happens more often while watched
+        state = self.symbol(stock_code)
+        state.watchers.append(callback)
+        if state.due > self.clock() + watched_interval and stock_code not in self.in_flight:
+            self.schedule(stock_code, self.clock())
+
+    def unwatch(self, stock_code: str, callback) -> None:
+        state = self.symbols.get(stock_code)
+        if state is None or callback not in state.watchers:
+            return
+
+        state.watchers.remove(callback)
+        if len(state.watchers) == 0 and not state.tracked:
+            del self.symbols[stock_code]
+
+    def isQueued(self, entry: tuple) -> bool:
+        # Entries for removed stocks or stocks that have been rescheduled since are out of date
+        state = self.symbols.get(entry[2])
+        return state is not None and state.due == entry[0] and entry[2] not in self.in_flight
+
+    def nextDue(self) -> 'float | None':
+        while len(self.queue) and not self.isQueued(self.queue[0]):
+            heapq.heappop(self.queue)
+        return self.queue[0][0] if len(self.queue) else None
+
+    def dueCodes(self) -> 'list[str]':
+        # Every stock that is due (or nearly due), marked as being fetched so it isn't asked for twice
+        cutoff = self.clock() + coalesce_window
+        codes = []
+        while len(self.queue) and self.queue[0][0] <= cutoff:
+            entry = heapq.heappop(self.queue)
+            if self.isQueued(entry):
+                codes.append(entry[2])
+                self.in_flight.add(entry[2])
+
+        if len(codes):
+            self.fetch_count += 1
+        return codes
+
+    def interval(self, state: SymbolState, quote: dict) -> float:
+        if len(state.watchers):
+            return watched_interval
+        if quote.get("marketState", "REGULAR") not in open_market_states:
+            return closed_interval
+        if state.unchanged:
+            return min(base_interval * 2 ** state.unchanged, max_unchanged_interval)
+        return base_interval
+
+    def errorInterval(self, state: SymbolState) -> float:
+        wait = min(error_interval * 2 ** (state.errors - 1), max_error_interval)
+        return wait * (1 + jitter * (self.random() * 2 - 1))
+
+    def complete(self, stock_codes: 'list[str]', quotes: 'dict[str, dict]') -> None:
+        # Schedule the next refresh of every fetched stock based on what came back
+        now = self.clock()
+        for stock_code in stock_codes:
+            self.in_flight.discard(stock_code)
+            state = self.symbols.get(stock_code)
+            if state is None:
+                continue
+
+            quote = quotes.get(stock_code)
+            if quote is None:
+                state.errors += 1
+                self.schedule(stock_code, now + self.errorInterval(state))
+            else:
+                state.errors = 0
+                price = quote.get("regularMarketPrice")
+                state.unchanged = state.unchanged + 1 if price == state.last_price else 0
+                state.last_price = price
+                self.schedule(stock_code, now + self.interval(state, quote))
+
+            # Info windows are told about errors too (quote is None)
+            for callback in list(state.watchers):
+                callback(quote)
+
+    def fail(self, stock_codes: 'list[str]') -> None:
+        # The whole request failed
+        self.complete(stock_codes, {})
@@ -0,0 +1,76 @@
+import queue                                            # For passing results back to the GUI thread
+import traceback                                        # For reporting errors in callbacks
+from concurrent.futures import ThreadPoolExecutor       # For running work in the background
+import metrics                                          # For counting GUI callbacks when metrics are on
+
+# Number of requests that can run at the same time
+fetch_workers = 4
+
+# Milliseconds between checks for finished work
+poll_interval = 50
+
+
+class BackgroundWorker():
+    def __init__(self, max_workers: int = fetch_workers) -> None:
+        # Network requests run in a pool, database work runs in order on its own thread
+        self.fetch_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+        self.database_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+
+        # (callback, result) pairs waiting to be run on the GUI thread
+        self.results = queue.SimpleQueue()
+
+    def run(self, executor: ThreadPoolExecutor, function, args: tuple, callback, error_callback):
+        future = executor.submit(function, *args)
+
+        def done(future) -> None:
+            # Runs on the worker thread, so only pass the result along
+            if future.cancelled():
+                return
+
+            error = future.exception()
+            if error is None:
+                if callback is not None:
+                    self.results.put((callback, future.result()))
+            elif error_callback is not None:
+                self.results.put((error_callback, error))
+
+        future.add_done_callback(done)
+        return future
+
+    def submit(self, function, *args, callback=None, error_callback=None):
+        # Run function(*args) in the background, then callback(result) on the GUI thread
+        return self.run(self.fetch_executor, function, args, callback, error_callback)
+
+    def submitDatabase(self, function, *args, callback=None, error_callback=None):
+        # Same as submit(), but for anything that uses the database connection
+        return self.run(self.database_executor, function, args, callback, error_callback)
+
+    def drain(self, max_items: int = 500) -> int:
+        # Run finished callbacks, stopping after max_items so the GUI stays responsive
+        count = 0
+        while count < max_items:
+            try:
+                callback, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+
+            # One broken callback (e.g. for a closed window) shouldn't stop the others
+            try:
+                callback(result)
+            except:
+                traceback.print_exc()
+            count += 1
+
+        metrics.count("ui.callbacks", count)
+        return count
+
+    def startPolling(self, window, interval: int = poll_interval) -> None:
+        def poll() -> None:
+            self.drain()
+            window.after(interval, poll)
+
+        window.after(interval, poll)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.fetch_executor.shutdown(wait=wait, cancel_futures=True)
+        self.database_executor.shutdown(wait=wait)
@@ -0,0 +1,51 @@
+import sqlite3                          # For database management
+import threading                        # For adding updates while a flush is running
+from metrics import timed               # For timing flushes when metrics are on
+
+# Columns of the stocks table that can be updated by a refresh
+stock_columns = ["selling_price", "price_change", "last_updated"]
+
+
+class WriteBuffer():
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+
+        # stock code -> {column: value}, later updates replace earlier ones
+        self.pending = {}
+        self.lock = threading.Lock()
+
+        self.flush_count = 0
+        self.rows_written = 0
+
+    def updateStock(self, stock_code: str, **values) -> None:
+        for column in values:
+            if column not in stock_columns:
+                raise ValueError(f"Unknown stocks column: {column}")
+
+        with self.lock:
+            self.pending.setdefault(stock_code, {}).update(values)
+
+    @timed("db.flush")
+    def flush(self) -> int:
+        # Write every pending update in one transaction, returns the number of rows changed
+        with self.lock:
+            pending, self.pending = self.pending, {}
+
+        if len(pending) == 0:
+            return 0
+
+        # Rows that update the same columns share one statement
+        statements = {}
+        for stock_code, values in pending.items():
+            columns = tuple(column for column in stock_columns if column in values)
+            statements.setdefault(columns, []).append([values[column] for column in columns] + [stock_code])
+
+        rows_affected = 0
+        with self.connection:
+            for columns, rows in statements.items():
+                sql = f"UPDATE stocks SET {', '.join(column + '=?' for column in columns)} WHERE stock_code=?;"
+                rows_affected += self.connection.executemany(sql, rows).rowcount
+
+        self.flush_count += 1
+        self.rows_written += rows_affected
+        return rows_affected